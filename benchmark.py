@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import chess
+import chess_engine
+
+# Search benchmark: python benchmark.py [--depth 5] [--output results.json] [--compare baseline.json]
+# Searches every position in bench/positions.fen from an empty TT and reports nodes, nps,
+# time-to-depth, TT hit rate, first-move cutoff ratio and evaluation calls per second. Runs offline on the CPU only.
+# --disable null_move,lmr switches off selective search features to measure what each one saves.
+# --micro instead times the per-leaf evaluation terms (legal-move vs attack-map mobility) on random positions.
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+POSITIONS_FILE = os.path.join(BENCH_DIR, "positions.fen")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_DEPTH = 5
+# A metric more than this fraction worse than the baseline counts as a regression
+DEFAULT_THRESHOLD = 0.10
+
+# Read "fen ; category" lines, skipping blank lines and # comments
+def load_positions(path=POSITIONS_FILE):
+    positions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fen, _, category = line.partition(";")
+            positions.append((fen.strip(), category.strip() or "unknown"))
+    return positions
+
+# Search one position to depth from an empty table; the search has no time limit so every
+# iteration completes and time-to-depth is comparable between runs
+def run_position(fen, category, depth, difficulty, disable=()):
+    board = chess.Board(fen)
+    chess_engine.transposition_table.clear()
+    time_to_depth = {}
+    context = chess_engine.SearchContext(stats=chess_engine.SearchStats())
+    for feature in disable:
+        setattr(context, feature, False)
+    context.on_iteration = lambda info: time_to_depth.__setitem__(str(info["depth"]), round(info["time"], 4))
+
+    start = time.perf_counter()
+    move = chess_engine.make_ai_move(board, difficulty, context, time_limit=0, max_depth=depth, workers=1,
+                                     use_book=False, use_tablebase=False)
+    elapsed = time.perf_counter() - start
+    stats = context.stats
+
+    return {
+        "fen": fen,
+        "category": category,
+        "bestmove": move.uci() if move else None,
+        "nodes": context.nodes,
+        "time": round(elapsed, 4),
+        "nps": int(context.nodes / max(elapsed, 1e-9)),
+        "time_to_depth": time_to_depth,
+        "tt_probes": stats.tt_probes,
+        "tt_hits": stats.tt_hits,
+        "tt_hit_rate": round(stats.tt_hit_rate(), 4),
+        "beta_cutoffs": stats.beta_cutoffs,
+        "first_move_cutoffs": stats.first_move_cutoffs,
+        "first_move_cutoff_ratio": round(stats.first_move_cutoff_ratio(), 4),
+        "eval_calls": stats.eval_calls,
+        "evals_per_second": int(stats.eval_calls / max(elapsed, 1e-9)),
+        "iterations": stats.iterations,
+    }
+
+def summarize(results, depth):
+    nodes = sum(r["nodes"] for r in results)
+    elapsed = sum(r["time"] for r in results)
+    probes = sum(r["tt_probes"] for r in results)
+    hits = sum(r["tt_hits"] for r in results)
+    eval_calls = sum(r["eval_calls"] for r in results)
+    cutoffs = sum(r["beta_cutoffs"] for r in results)
+    first_move_cutoffs = sum(r["first_move_cutoffs"] for r in results)
+    # Time-to-depth only sums positions that reached the depth (a found mate ends the search early)
+    time_to_depth = {}
+    for d in range(1, depth + 1):
+        times = [r["time_to_depth"][str(d)] for r in results if str(d) in r["time_to_depth"]]
+        if times:
+            time_to_depth[str(d)] = round(sum(times), 4)
+    return {
+        "nodes": nodes,
+        "time": round(elapsed, 4),
+        "nps": int(nodes / max(elapsed, 1e-9)),
+        "time_to_depth": time_to_depth,
+        "tt_hit_rate": round(hits / probes, 4) if probes else 0.0,
+        "first_move_cutoff_ratio": round(first_move_cutoffs / cutoffs, 4) if cutoffs else 0.0,
+        "eval_calls": eval_calls,
+        "evals_per_second": int(eval_calls / max(elapsed, 1e-9)),
+    }
+
+def run_benchmark(depth=DEFAULT_DEPTH, difficulty="hard", positions=None, verbose=True, disable=()):
+    if positions is None:
+        positions = load_positions()
+    results = []
+    for fen, category in positions:
+        result = run_position(fen, category, depth, difficulty, disable)
+        results.append(result)
+        if verbose:
+            print(f"{category:<11} {result['nodes']:>9} nodes {result['time']:>8.2f}s {result['nps']:>7} nps  "
+                  f"tt {result['tt_hit_rate']:.1%}  {result['bestmove']}  {fen}")
+    return {
+        "depth": depth,
+        "difficulty": difficulty,
+        "disabled": list(disable),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "positions": results,
+        "summary": summarize(results, depth),
+    }
+
+# Compare a run against a baseline. Speed metrics (nps, evals/s, time-to-depth) beyond the
+# threshold are regressions; a changed node count only means the search itself changed.
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    notes = []
+    now, before = current["summary"], baseline["summary"]
+
+    for metric in ("nps", "evals_per_second"):
+        if before[metric] and now[metric] < before[metric] * (1 - threshold):
+            regressions.append(f"{metric}: {before[metric]} -> {now[metric]} "
+                               f"({now[metric] / before[metric] - 1:+.1%})")
+    for d, before_time in before["time_to_depth"].items():
+        now_time = now["time_to_depth"].get(d)
+        if now_time is not None and before_time and now_time > before_time * (1 + threshold):
+            regressions.append(f"time to depth {d}: {before_time:.3f}s -> {now_time:.3f}s "
+                               f"({now_time / before_time - 1:+.1%})")
+    if now["tt_hit_rate"] < before["tt_hit_rate"] - threshold:
+        regressions.append(f"tt_hit_rate: {before['tt_hit_rate']:.1%} -> {now['tt_hit_rate']:.1%}")
+
+    if current["depth"] != baseline["depth"]:
+        notes.append(f"depth differs: baseline {baseline['depth']}, current {current['depth']}")
+    if now["nodes"] != before["nodes"]:
+        notes.append(f"node count changed: {before['nodes']} -> {now['nodes']} (search behaviour changed)")
+    return regressions, notes
+
+# Mobility term of the hard evaluation as it used to be computed: a full legal move
+# generation for each side, flipping board.turn in between
+def legal_move_mobility(board):
+    current_turn = board.turn
+    board.turn = chess.WHITE
+    white_mobility = len(list(board.legal_moves))
+    board.turn = chess.BLACK
+    black_mobility = len(list(board.legal_moves))
+    board.turn = current_turn
+    return white_mobility - black_mobility
+
+def attack_map_mobility(board):
+    return chess_engine.attack_mobility(board, chess.WHITE) - chess_engine.attack_mobility(board, chess.BLACK)
+
+# Microbenchmark of the per-leaf evaluation cost on positions from random games: the mobility
+# term computed both ways, and a full hard evaluation. Prints microseconds per position.
+def run_micro(count=400, repeat=20, seed=1):
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        board = chess.Board()
+        for ply in range(rng.randint(4, 80)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        if not board.is_game_over():
+            boards.append(board)
+
+    timings = {}
+    for name, function in (("mobility: legal move generation x2", legal_move_mobility),
+                           ("mobility: attack bitboards", attack_map_mobility),
+                           ("evaluate_board hard", lambda board: chess_engine.evaluate_board(board, "hard"))):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for board in boards:
+                function(board)
+        timings[name] = (time.perf_counter() - start) / (repeat * len(boards)) * 1e6
+        print(f"{name:<36}: {timings[name]:8.1f} us per position")
+    return timings
+
+def print_summary(report):
+    summary = report["summary"]
+    print("===========================")
+    print(f"Depth           : {report['depth']}")
+    print(f"Nodes searched  : {summary['nodes']}")
+    print(f"Total time (s)  : {summary['time']:.2f}")
+    print(f"Nodes/second    : {summary['nps']}")
+    print(f"TT hit rate     : {summary['tt_hit_rate']:.1%}")
+    print(f"First-move cuts : {summary.get('first_move_cutoff_ratio', 0.0):.1%}")
+    print(f"Evals/second    : {summary['evals_per_second']}")
+    print("Time to depth   : " + "  ".join(f"{d}: {t:.3f}s" for d, t in summary["time_to_depth"].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chess engine search")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--difficulty", default="hard", choices=["medium", "hard"])
+    parser.add_argument("--positions", default=POSITIONS_FILE, help="FEN file to search")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {BASELINE_FILE}")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_FILE, metavar="BASELINE",
+                        help="compare against a stored baseline (default bench/baseline.json)")
+    parser.add_argument("--input", help="compare this stored result instead of running the search")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown as a fraction before a metric is a regression")
+    parser.add_argument("--disable", default="", metavar="FEATURES",
+                        help="comma-separated search features to switch off: " + ", ".join(chess_engine.SEARCH_FEATURES))
+    parser.add_argument("--micro", action="store_true",
+                        help="only run the per-leaf evaluation microbenchmark (mobility term before/after)")
+    args = parser.parse_args()
+    if args.micro:
+        run_micro()
+        return
+    disable = [name for name in args.disable.split(",") if name]
+    unknown = set(disable) - set(chess_engine.SEARCH_FEATURES)
+    if unknown:
+        parser.error(f"unknown search features: {', '.join(sorted(unknown))}")
+
+    if args.input:
+        with open(args.input) as f:
+            report = json.load(f)
+    else:
+        report = run_benchmark(args.depth, args.difficulty, load_positions(args.positions), disable=disable)
+    print_summary(report)
+
+    for path in filter(None, [args.output, BASELINE_FILE if args.save_baseline else None]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions, notes = compare(report, baseline, args.threshold)
+        for note in notes:
+            print(f"Note: {note}")
+        if regressions:
+            print(f"REGRESSION (threshold {args.threshold:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+if __name__ == "__main__":
+    main()
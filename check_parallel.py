@@ -0,0 +1,31 @@
+import argparse
+import sys
+import chess_engine
+from benchmark import load_positions, POSITIONS_FILE
+
+# Check that a deterministic ParallelSearch picks the same move as the serial search:
+# python check_parallel.py [--workers 2] [--depth 4]
+# Searches every position in bench/positions.fen with iterative_deepening and with the parallel
+# search (both with the selective search features off, as deterministic mode runs), prints the
+# speedup and exits with code 1 if any move differs.
+# --shared runs the default mode instead (shared table, selective features on), which may pick
+# other moves than iterative_deepening; the differences are printed but do not fail the check.
+
+def main():
+    parser = argparse.ArgumentParser(description="Check deterministic parallel search against the serial search")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--difficulty", default="hard", choices=["medium", "hard"])
+    parser.add_argument("--positions", default=POSITIONS_FILE, help="FEN file to search")
+    parser.add_argument("--shared", action="store_true",
+                        help="check the default shared-table mode, which is allowed to differ")
+    args = parser.parse_args()
+
+    fens = [fen for fen, category in load_positions(args.positions)]
+    speedup, mismatches = chess_engine.report_parallel_speedup(fens, args.workers, args.difficulty, args.depth,
+                                                               deterministic=not args.shared)
+    if mismatches and not args.shared:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
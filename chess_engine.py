@@ -0,0 +1,1694 @@
+import chess
+import chess.polyglot
+import os
+import time
+import random
+import threading
+import struct
+import atexit
+from collections import OrderedDict
+
+# Chess engine: evaluation, search and the background AI worker.
+# Depends only on python-chess, so it can be imported without a display or audio device.
+# multiprocessing and concurrent.futures are imported where they are first needed: together
+# they cost more to import than the rest of this module.
+
+# Corrected piece-square tables (64 elements each)
+piece_square_tables = {
+    chess.PAWN: [
+        0,  0,  0,  0,  0,  0,  0,  0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5,  5, 10, 25, 25, 10,  5,  5,
+        0,  0,  0, 20, 20,  0,  0,  0,
+        5, -5,-10,  0,  0,-10, -5,  5,
+        5, 10, 10,-20,-20, 10, 10,  5,
+        0,  0,  0,  0,  0,  0,  0,  0
+    ],
+    chess.KNIGHT: [
+        -50,-40,-30,-30,-30,-30,-40,-50,
+        -40,-20,  0,  0,  0,  0,-20,-40,
+        -30,  0, 10, 15, 15, 10,  0,-30,
+        -30,  5, 15, 20, 20, 15,  5,-30,
+        -30,  0, 15, 20, 20, 15,  0,-30,
+        -30,  5, 10, 15, 15, 10,  5,-30,
+        -40,-20,  0,  5,  5,  0,-20,-40,
+        -50,-40,-30,-30,-30,-30,-40,-50
+    ],
+    chess.BISHOP: [
+        -20,-10,-10,-10,-10,-10,-10,-20,
+        -10,  0,  0,  0,  0,  0,  0,-10,
+        -10,  0, 10, 10, 10, 10,  0,-10,
+        -10,  5,  5, 10, 10,  5,  5,-10,
+        -10,  0,  5, 10, 10,  5,  0,-10,
+        -10,  5,  5,  5,  5,  5,  5,-10,
+        -10,  0,  5,  0,  0,  0,  0,-10,
+        -20,-10,-10,-10,-10,-10,-10,-20
+    ],
+    chess.ROOK: [
+        0,  0,  0,  0,  0,  0,  0,  0,
+        5, 10, 10, 10, 10, 10, 10,  5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        -5,  0,  0,  0,  0,  0,  0, -5,
+        0,  0,  0,  5,  5,  0,  0,  0
+    ],
+    chess.QUEEN: [
+        -20,-10,-10, -5, -5,-10,-10,-20,
+        -10,  0,  0,  0,  0,  0,  0,-10,
+        -10,  0,  5,  5,  5,  5,  0,-10,
+        -5,  0,  5,  5,  5,  5,  0, -5,
+        0,  0,  5,  5,  5,  5,  0, -5,
+        -10,  5,  5,  5,  5,  5,  0,-10,
+        -10,  0,  5,  0,  0,  0,  0,-10,
+        -20,-10,-10, -5, -5,-10,-10,-20
+    ],
+    chess.KING: [
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -30,-40,-40,-50,-50,-40,-40,-30,
+        -20,-30,-30,-40,-40,-30,-30,-20,
+        -10,-20,-20,-20,-20,-20,-20,-10,
+        20, 20,  0,  0,  0,  0, 20, 20,
+        20, 30, 10,  0,  0, 10, 30, 20
+    ]
+}
+
+# End game king piece square table (64 elements)
+king_endgame_table = [
+    -50,-40,-30,-20,-20,-30,-40,-50,
+    -30,-20,-10,  0,  0,-10,-20,-30,
+    -30,-10, 20, 30, 30, 20,-10,-30,
+    -30,-10, 30, 40, 40, 30,-10,-30,
+    -30,-10, 30, 40, 40, 30,-10,-30,
+    -30,-10, 20, 30, 30, 20,-10,-30,
+    -30,-30,  0,  0,  0,  0,-30,-30,
+    -50,-30,-30,-30,-30,-30,-30,-50
+]
+
+# Piece values
+piece_values = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, 
+                chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+# Signed (White positive) piece-square values per color and piece type, indexed by square.
+# Black reads the tables from 63 - square, like evaluate_board always has.
+def _signed_table(table, color):
+    if color == chess.WHITE:
+        return list(table)
+    return [-table[63 - square] for square in chess.SQUARES]
+
+PST_VALUES = {
+    color: {piece_type: _signed_table(table, color) for piece_type, table in piece_square_tables.items()}
+    for color in chess.COLORS
+}
+KING_ENDGAME_VALUES = {color: _signed_table(king_endgame_table, color) for color in chess.COLORS}
+MATERIAL_VALUES = {
+    color: {piece_type: value if color == chess.WHITE else -value for piece_type, value in piece_values.items()}
+    for color in chess.COLORS
+}
+
+# Running material and piece-square totals (White minus Black) plus the piece count.
+# make_move/unmake_move keep it in sync with the board in O(1) per move.
+class IncrementalEvaluator:
+    def __init__(self, board):
+        self.material = 0
+        self.pst = 0
+        self.king_pst = 0
+        self.king_endgame_pst = 0
+        self.piece_count = 0
+        self.stack = []
+        for square, piece in board.piece_map().items():
+            self.update(piece.piece_type, piece.color, square, 1)
+
+    def update(self, piece_type, color, square, sign):
+        self.piece_count += sign
+        if piece_type == chess.KING:
+            self.king_pst += sign * PST_VALUES[color][chess.KING][square]
+            self.king_endgame_pst += sign * KING_ENDGAME_VALUES[color][square]
+        else:
+            self.material += sign * MATERIAL_VALUES[color][piece_type]
+            self.pst += sign * PST_VALUES[color][piece_type][square]
+
+    def push(self, changes):
+        self.stack.append((self.material, self.pst, self.king_pst, self.king_endgame_pst, self.piece_count))
+        for piece_type, color, square, sign in changes:
+            self.update(piece_type, color, square, sign)
+
+    def pop(self):
+        self.material, self.pst, self.king_pst, self.king_endgame_pst, self.piece_count = self.stack.pop()
+
+    def score(self, difficulty):
+        if difficulty == "easy":
+            return self.material
+        king_pst = self.king_endgame_pst if self.piece_count <= 12 else self.king_pst
+        return self.material + (self.pst + king_pst) / 10
+
+# Zobrist keys (Polyglot layout, so keys match chess.polyglot.zobrist_hash)
+ZOBRIST_ARRAY = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+zobrist_hash = chess.polyglot.zobrist_hash
+_zobrist_hasher = chess.polyglot.ZobristHasher(ZOBRIST_ARRAY)
+ZOBRIST_TURN = ZOBRIST_ARRAY[780]
+
+# Per-difficulty salt XORed into the Zobrist key of every searched position. Scores depend on
+# the difficulty's evaluation, so the salt keeps one difficulty's transposition table entries
+# from being returned to a search with another. make_move and friends update keys by XOR, so
+# the salt carries through the whole search tree.
+DIFFICULTY_KEYS = {
+    "easy": 0x6A09E667F3BCC908,
+    "medium": 0xBB67AE8584CAA73B,
+    "hard": 0x3C6EF372FE94F82B,
+}
+
+def search_key(board, difficulty):
+    return zobrist_hash(board) ^ DIFFICULTY_KEYS[difficulty]
+
+def zobrist_piece(piece_type, color, square):
+    return ZOBRIST_ARRAY[64 * ((piece_type - 1) * 2 + color) + square]
+
+# Pieces added (+1) and removed (-1) by a move, as (piece_type, color, square, sign) tuples
+def move_changes(board, move):
+    from_square, to_square = move.from_square, move.to_square
+    color = board.turn
+    piece_type = board.piece_type_at(from_square)
+    changes = [(piece_type, color, from_square, -1), (move.promotion or piece_type, color, to_square, 1)]
+
+    if board.is_en_passant(move):
+        captured_square = to_square - 8 if color == chess.WHITE else to_square + 8
+        changes.append((chess.PAWN, not color, captured_square, -1))
+    else:
+        captured_type = board.piece_type_at(to_square)
+        if captured_type:
+            changes.append((captured_type, not color, to_square, -1))
+
+    if piece_type == chess.KING and abs(chess.square_file(to_square) - chess.square_file(from_square)) == 2:
+        rank = chess.square_rank(from_square)
+        if to_square > from_square:
+            rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+        else:
+            rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+        changes.append((chess.ROOK, color, rook_from, -1))
+        changes.append((chess.ROOK, color, rook_to, 1))
+    return changes
+
+# Push a move and return the Zobrist key of the new position, updated incrementally from key.
+# When an evaluator is given its running totals are updated too; undo with unmake_move.
+def make_move(board, move, key, evaluator=None):
+    changes = move_changes(board, move)
+    for piece_type, color, square, sign in changes:
+        key ^= zobrist_piece(piece_type, color, square)
+
+    castling_rights = board.castling_rights
+    if castling_rights:
+        key ^= _zobrist_hasher.hash_castling(board)
+    if board.ep_square is not None:
+        key ^= _zobrist_hasher.hash_ep_square(board)
+
+    board.push(move)
+    if evaluator is not None:
+        evaluator.push(changes)
+
+    if castling_rights:
+        key ^= _zobrist_hasher.hash_castling(board)
+    if board.ep_square is not None:
+        key ^= _zobrist_hasher.hash_ep_square(board)
+    return key ^ ZOBRIST_TURN
+
+def unmake_move(board, evaluator=None):
+    board.pop()
+    if evaluator is not None:
+        evaluator.pop()
+
+# Pass the turn (for null-move pruning) and return the new key; undo with unmake_move
+def make_null_move(board, key, evaluator=None):
+    if board.ep_square is not None:
+        key ^= _zobrist_hasher.hash_ep_square(board)
+    board.push(chess.Move.null())
+    if evaluator is not None:
+        evaluator.push(())
+    return key ^ ZOBRIST_TURN
+
+# Transposition table bound types
+TT_EXACT = 0
+TT_LOWER = 1
+TT_UPPER = 2
+
+# Two-tier transposition table: each bucket has a depth-preferred slot and an always-replace slot.
+# Entries are (key, depth, score, bound, best_move, generation) tuples.
+class TranspositionTable:
+    def __init__(self, size=1 << 17):
+        self.size = size
+        self.mask = size - 1
+        self.generation = 0
+        self.clear()
+
+    def clear(self):
+        self.depth_slots = [None] * self.size
+        self.always_slots = [None] * self.size
+
+    def new_search(self):
+        self.generation += 1
+
+    def probe(self, key):
+        index = key & self.mask
+        entry = self.depth_slots[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        entry = self.always_slots[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, best_move=None):
+        index = key & self.mask
+        entry = (key, depth, score, bound, best_move, self.generation)
+        current = self.depth_slots[index]
+        if current is None or current[0] == key or depth >= current[1] or current[5] != self.generation:
+            self.depth_slots[index] = entry
+        else:
+            self.always_slots[index] = entry
+
+# Moves packed into 16 bits for shared tables: from | to << 6 | promotion << 12, 0 for no move
+def encode_move(move):
+    if move is None:
+        return 0
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+def decode_move(code):
+    if not code:
+        return None
+    return chess.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
+
+# Packed TT record: (key ^ meta ^ score_bits, meta, score_bits), where meta holds the move,
+# depth, bound, a valid bit and the generation. A record torn by a concurrent store from
+# another process fails the key check and simply reads as a miss.
+TT_RECORD = struct.Struct("<QQQ")
+_SCORE = struct.Struct("<d")
+_SCORE_BITS = struct.Struct("<Q")
+TT_VALID_BIT = 1 << 31
+
+# Same interface and replacement policy as TranspositionTable, stored as packed records in a
+# buffer (e.g. multiprocessing shared memory) so several processes can share one table.
+# Slot 2 * index is the depth-preferred slot of a bucket, 2 * index + 1 the always-replace slot.
+class SharedTranspositionTable:
+    def __init__(self, buffer, size=1 << 17):
+        self.buffer = buffer
+        self.size = size
+        self.mask = size - 1
+        self.generation = 0
+
+    @staticmethod
+    def bytes_needed(size):
+        return size * 2 * TT_RECORD.size
+
+    def clear(self):
+        self.buffer[:self.bytes_needed(self.size)] = bytes(self.bytes_needed(self.size))
+
+    def new_search(self):
+        self.generation += 1
+
+    def _read(self, slot):
+        check, meta, score_bits = TT_RECORD.unpack_from(self.buffer, slot * TT_RECORD.size)
+        return check ^ meta ^ score_bits, meta, score_bits
+
+    def _write(self, slot, key, depth, score, bound, best_move):
+        meta = encode_move(best_move) | depth << 16 | bound << 24 | TT_VALID_BIT | (self.generation & 0xFFFF) << 32
+        score_bits = _SCORE_BITS.unpack(_SCORE.pack(score))[0]
+        TT_RECORD.pack_into(self.buffer, slot * TT_RECORD.size, key ^ meta ^ score_bits, meta, score_bits)
+
+    def probe(self, key):
+        slot = (key & self.mask) * 2
+        for slot in (slot, slot + 1):
+            stored_key, meta, score_bits = self._read(slot)
+            if stored_key == key and meta & TT_VALID_BIT:
+                score = _SCORE.unpack(_SCORE_BITS.pack(score_bits))[0]
+                return (key, (meta >> 16) & 0xFF, score, (meta >> 24) & 0x7F, decode_move(meta & 0xFFFF), meta >> 32)
+        return None
+
+    def store(self, key, depth, score, bound, best_move=None):
+        slot = (key & self.mask) * 2
+        current_key, meta, score_bits = self._read(slot)
+        if not meta & TT_VALID_BIT or current_key == key or depth >= (meta >> 16) & 0xFF or \
+           meta >> 32 != self.generation & 0xFFFF:
+            self._write(slot, key, depth, score, bound, best_move)
+        else:
+            self._write(slot + 1, key, depth, score, bound, best_move)
+
+# Persistent table file: a header (magic, format version, evaluation version, difficulty salts,
+# record count, generation) followed by the packed records of a SharedTranspositionTable. The
+# records are memory-mapped, so nothing is read up front and pages load as the search touches
+# them. Every record checks itself against its key, so a crash, or another process writing the
+# same file, can at worst lose entries: a torn record reads as a miss. Bump TT_FILE_VERSION when
+# the record format or the meaning of stored scores changes, and EVAL_VERSION when
+# evaluate_position changes, so old files are discarded instead of misleading the search.
+TT_FILE_MAGIC = b"CGTT"
+TT_FILE_VERSION = 6
+EVAL_VERSION = 1
+TT_FILE_HEADER = struct.Struct("<4sIIIQQ")
+
+# Checksum of the difficulty key salts the file's entries were stored under
+def difficulty_keys_checksum():
+    import zlib
+    return zlib.crc32(repr(sorted(DIFFICULTY_KEYS.items())).encode())
+
+# Every process holds a shared lock on the file while it is mapped. Only a process that gets the
+# exclusive lock, so that no other process has the file mapped, may recreate it: resizing a file
+# under another process's mapping makes that process crash with SIGBUS. Without fcntl (Windows)
+# there are no locks, but the system itself refuses to resize a file another process has mapped.
+class PersistentTranspositionTable(SharedTranspositionTable):
+    def __init__(self, path, size=1 << 17):
+        import mmap
+        try:
+            import fcntl
+        except ImportError:
+            fcntl = None
+        self.path = path
+        length = TT_FILE_HEADER.size + self.bytes_needed(size)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            exclusive = True
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another process has the file open: wait until it has finished setting it up
+                    fcntl.flock(self.fd, fcntl.LOCK_SH)
+                    exclusive = False
+            generation = self._read_generation(size, length)
+            if generation is None:
+                if not exclusive:
+                    raise OSError(f"{path} is in use by another process with an incompatible table")
+                # Missing, truncated or incompatible file: start again from an empty table
+                os.ftruncate(self.fd, 0)
+                os.ftruncate(self.fd, length)
+                generation = 0
+            self.mmap = mmap.mmap(self.fd, length)
+        except BaseException:
+            os.close(self.fd)
+            raise
+        self.view = memoryview(self.mmap)
+        super().__init__(self.view[TT_FILE_HEADER.size:], size)
+        self.generation = generation
+        self._write_header()
+        if fcntl is not None and exclusive:
+            fcntl.flock(self.fd, fcntl.LOCK_SH)
+    
+    # Generation from the file header, or None if the file has the wrong length or was written
+    # with another format, evaluation, set of difficulty salts or record count
+    def _read_generation(self, size, length):
+        if os.fstat(self.fd).st_size != length:
+            return None
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        header = os.read(self.fd, TT_FILE_HEADER.size)
+        if len(header) != TT_FILE_HEADER.size:
+            return None
+        magic, version, eval_version, difficulty_keys, stored_size, generation = TT_FILE_HEADER.unpack(header)
+        if (magic, version, eval_version, difficulty_keys, stored_size) != \
+           (TT_FILE_MAGIC, TT_FILE_VERSION, EVAL_VERSION, difficulty_keys_checksum(), size):
+            return None
+        return generation
+    
+    def new_search(self):
+        super().new_search()
+        self._write_header()
+    
+    def _write_header(self):
+        TT_FILE_HEADER.pack_into(self.mmap, 0, TT_FILE_MAGIC, TT_FILE_VERSION, EVAL_VERSION,
+                                 difficulty_keys_checksum(), self.size, self.generation)
+    
+    # Write the header and flush the records to disk; called at exit by use_persistent_table.
+    # Closing the file also releases its lock.
+    def close(self):
+        if self.mmap is None:
+            return
+        self._write_header()
+        self.mmap.flush()
+        self.buffer.release()
+        self.view.release()
+        self.mmap.close()
+        os.close(self.fd)
+        self.mmap = None
+
+# Global transposition table
+transposition_table = TranspositionTable()
+
+# Replace the in-memory transposition table with one persisted in the file at path, so later
+# sessions start with the positions earlier ones searched. The file is flushed at exit. Raises
+# OSError, keeping the current table, if the file cannot be opened.
+def use_persistent_table(path, size=1 << 17):
+    global transposition_table
+    table = PersistentTranspositionTable(path, size)
+    if isinstance(transposition_table, PersistentTranspositionTable):
+        transposition_table.close()
+    transposition_table = table
+    atexit.register(transposition_table.close)
+    return transposition_table
+
+# Search limits per difficulty: max_depth in plies, time_limit in seconds per move, and
+# workers > 1 to use the multi-process ParallelSearch. The opening book is used for the first
+# book_depth plies, picking moves with probability weight ** book_weight_power (higher powers
+# stick closer to the book's main lines).
+DIFFICULTY_SETTINGS = {
+    "medium": {"max_depth": 2, "time_limit": 1.0, "book_depth": 8, "book_weight_power": 0.5},
+    "hard": {"max_depth": 6, "time_limit": 3.0, "workers": 1, "book_depth": 20, "book_weight_power": 2},
+}
+
+# Mates score MATE_SCORE minus the plies from the search root to the mate, so the search
+# prefers the shortest mate and the distance can be read back from the score. Every score
+# beyond MATE_THRESHOLD is a mate; MAX_MATE_PLY bounds the plies of a search, extensions and
+# quiescence included.
+MATE_SCORE = 10000
+MAX_MATE_PLY = 256
+MATE_THRESHOLD = MATE_SCORE - MAX_MATE_PLY
+# Score of a tablebase win: below every mate score, so a forced mate is still preferred
+TB_WIN_SCORE = MATE_SCORE // 2
+
+# Mate scores go into the transposition table relative to the node instead of the root, so an
+# entry reached again at another ply still gives the right distance to mate
+def score_to_tt(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+def score_from_tt(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+# Raised inside the search once it has been cancelled or has run out of time/nodes
+class SearchAborted(Exception):
+    pass
+
+# Search counters, collected when a SearchStats is set as context.stats. Every hook in the
+# search is skipped when context.stats is None, so disabled stats cost one attribute test per node.
+# With log set, each completed iteration is also logged as JSON to the "chess_engine.search" logger.
+class SearchStats:
+    COUNTERS = ("nodes", "qnodes", "tt_probes", "tt_hits", "tt_stores", "beta_cutoffs", "first_move_cutoffs", "eval_calls",
+                "tb_hits", "null_cutoffs", "reductions", "researches")
+
+    def __init__(self, log=False):
+        self.log = log
+        self.reset()
+
+    def reset(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        # One record per completed iteration, see end_iteration
+        self.iterations = []
+
+    # Add the counters of another SearchStats (e.g. from a parallel search worker)
+    def merge(self, other):
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def first_move_cutoff_ratio(self):
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.0
+
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self):
+        counters = {name: getattr(self, name) for name in self.COUNTERS}
+        counters["first_move_cutoff_ratio"] = round(self.first_move_cutoff_ratio(), 4)
+        counters["tt_hit_rate"] = round(self.tt_hit_rate(), 4)
+        return counters
+
+    # Record a completed iteration: cumulative counters plus the nodes this iteration searched
+    # and the effective branching factor (its nodes divided by the previous iteration's)
+    def end_iteration(self, depth, elapsed):
+        record = self.as_dict()
+        total_nodes = self.nodes + self.qnodes
+        previous_total = self.iterations[-1]["total_nodes"] if self.iterations else 0
+        previous_nodes = self.iterations[-1]["iteration_nodes"] if self.iterations else 0
+        record["depth"] = depth
+        record["time"] = round(elapsed, 4)
+        record["total_nodes"] = total_nodes
+        record["iteration_nodes"] = total_nodes - previous_total
+        record["branching_factor"] = round(record["iteration_nodes"] / previous_nodes, 3) if previous_nodes else None
+        self.iterations.append(record)
+        if self.log:
+            import json
+            import logging
+            logging.getLogger("chess_engine.search").info(json.dumps(record))
+        return record
+
+# Selective search features of negamax. Each is a SearchContext attribute, on by default, that
+# can be switched off for one search (e.g. to measure it with benchmark.py --disable).
+SEARCH_FEATURES = ("pvs", "aspiration", "null_move", "lmr", "check_extensions")
+
+# State shared by every node of one search; cancel() may be called from another thread
+class SearchContext:
+    def __init__(self, stop_event=None, stats=None):
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        for name in SEARCH_FEATURES:
+            setattr(self, name, True)
+        self.evaluator = None
+        # Called with an info dict (depth, score, nodes, time, pv) after each completed iteration
+        self.on_iteration = None
+        # Optional SearchStats; reset by start() and added to the on_iteration info as "stats"
+        self.stats = stats
+        # SyzygyTablebase probed inside the search, set by make_ai_move (None disables probing)
+        self.tablebase = None
+        # A pondering search has no deadline until ponderhit(); the lock orders the two with start()
+        self.pondering = False
+        self.lock = threading.Lock()
+        self.start()
+
+    def start(self, time_limit=None, node_limit=None):
+        if self.stats is not None:
+            self.stats.reset()
+        self.start_time = time.monotonic()
+        with self.lock:
+            self.time_limit = time_limit
+            self.deadline = self.start_time + time_limit if time_limit and not self.pondering else None
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.root_ply = 0
+        # Depth of the current iteration, which bounds check extensions
+        self.root_depth = 0
+        # Move ordering heuristics: two killer moves per ply, history scores per color and from/to
+        self.killers = {}
+        self.history = {chess.WHITE: [0] * 4096, chess.BLACK: [0] * 4096}
+
+    # Remember a quiet move that caused a beta cutoff as a killer and in the history table
+    def record_cutoff(self, board, move, depth):
+        if board.is_capture(move):
+            return
+        killers = self.killers.setdefault(len(board.move_stack) - self.root_ply, [None, None])
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[board.turn][move.from_square * 64 + move.to_square] += depth * depth
+
+    # The pondered move was played: the search now runs on its normal time limit, counting the
+    # time spent pondering, so it stops at once if it has pondered for longer than that
+    def ponderhit(self):
+        with self.lock:
+            self.pondering = False
+            if self.time_limit:
+                self.deadline = max(self.start_time + self.time_limit, time.monotonic())
+
+    def cancel(self):
+        self.stop_event.set()
+
+    # Stop at the next deadline check but, unlike cancel(), keep the best move found so far
+    def finish(self):
+        self.deadline = time.monotonic()
+
+    def is_cancelled(self):
+        return self.stop_event.is_set()
+
+    def check(self):
+        self.nodes += 1
+        if self.stop_event.is_set():
+            raise SearchAborted()
+        if self.node_limit and self.nodes >= self.node_limit:
+            raise SearchAborted()
+        if self.deadline and self.nodes % 64 == 0 and time.monotonic() >= self.deadline:
+            raise SearchAborted()
+
+# Most valuable victim / least valuable attacker capture scores, indexed [victim][attacker]
+MVV_LVA = [[0] * 7 for _ in range(7)]
+for victim in chess.PIECE_TYPES:
+    for attacker in chess.PIECE_TYPES:
+        MVV_LVA[victim][attacker] = 10 * piece_values[victim] - attacker
+
+PROMOTION_BONUS = 900
+
+# Evaluate move for sorting (no push/pop: captures by MVV-LVA, promotions, central pawn/knight moves)
+def evaluate_move(board, move):
+    score = 0
+    attacker = board.piece_type_at(move.from_square)
+    victim = board.piece_type_at(move.to_square)
+    if victim and board.color_at(move.to_square) != board.turn:
+        score += MVV_LVA[victim][attacker]
+    elif attacker == chess.PAWN and move.to_square == board.ep_square:
+        score += MVV_LVA[chess.PAWN][chess.PAWN]
+    
+    if move.promotion:
+        score += PROMOTION_BONUS
+    
+    if attacker == chess.PAWN or attacker == chess.KNIGHT:
+        to_file = chess.square_file(move.to_square)
+        to_rank = chess.square_rank(move.to_square)
+        center_distance = abs(3.5 - to_file) + abs(3.5 - to_rank)
+        score += (4 - center_distance) * 5
+    
+    return score
+
+# Piece-square sums for every occupancy byte of every rank, so a bitboard's PST total takes one
+# lookup per occupied rank: RANK_PST[color][piece_type][rank][byte]. The tables are built by the
+# first evaluate_material_and_pst call rather than at import, as building them took more than
+# half of this module's own import time.
+def _rank_byte_tables(values):
+    tables = []
+    for rank in range(8):
+        # Each byte is its lowest set bit plus a byte already in the table
+        table = [0] * 256
+        for byte in range(1, 256):
+            lowest = (byte & -byte).bit_length() - 1
+            table[byte] = table[byte & (byte - 1)] + values[rank * 8 + lowest]
+        tables.append(table)
+    return tables
+
+RANK_PST = {}
+RANK_KING_ENDGAME = {}
+
+# Each dict is filled by a single update, so another thread sees it either empty or complete
+def _build_rank_tables():
+    RANK_PST.update({
+        color: {piece_type: _rank_byte_tables(values) for piece_type, values in PST_VALUES[color].items()}
+        for color in chess.COLORS
+    })
+    RANK_KING_ENDGAME.update({color: _rank_byte_tables(KING_ENDGAME_VALUES[color]) for color in chess.COLORS})
+
+def bitboard_pst(mask, rank_tables):
+    score = 0
+    rank = 0
+    while mask:
+        byte = mask & 0xFF
+        if byte:
+            score += rank_tables[rank][byte]
+        mask >>= 8
+        rank += 1
+    return score
+
+# Material and piece-square score computed from scratch on the bitboards, plus the piece count
+def evaluate_material_and_pst(board, difficulty):
+    piece_count = board.occupied.bit_count()
+    score = 0
+    pst = 0
+    if not RANK_KING_ENDGAME and difficulty != "easy":
+        _build_rank_tables()
+    
+    for piece_type in chess.PIECE_TYPES:
+        white_mask = board.pieces_mask(piece_type, chess.WHITE)
+        black_mask = board.pieces_mask(piece_type, chess.BLACK)
+        score += piece_values[piece_type] * (white_mask.bit_count() - black_mask.bit_count())
+        
+        if difficulty != "easy":
+            if piece_type == chess.KING and piece_count <= 12:
+                pst += bitboard_pst(white_mask, RANK_KING_ENDGAME[chess.WHITE])
+                pst += bitboard_pst(black_mask, RANK_KING_ENDGAME[chess.BLACK])
+            else:
+                pst += bitboard_pst(white_mask, RANK_PST[chess.WHITE][piece_type])
+                pst += bitboard_pst(black_mask, RANK_PST[chess.BLACK][piece_type])
+    
+    if difficulty != "easy":
+        score += pst / 10
+    return score, piece_count
+
+# Square masks for the positional terms of the hard evaluation
+CASTLED_KING_SQUARES = {chess.WHITE: chess.BB_G1 | chess.BB_C1, chess.BLACK: chess.BB_G8 | chess.BB_C8}
+CENTER_SQUARES = chess.BB_D4 | chess.BB_E4 | chess.BB_D5 | chess.BB_E5
+CENTRAL_PAWN_ZONE = (chess.BB_FILE_C | chess.BB_FILE_D | chess.BB_FILE_E | chess.BB_FILE_F) & (chess.BB_RANK_4 | chess.BB_RANK_5)
+WHITE_KNIGHT_HOMES = chess.BB_B1 | chess.BB_G1
+WHITE_BISHOP_HOMES = chess.BB_C1 | chess.BB_F1
+BLACK_KNIGHT_HOMES = chess.BB_B8 | chess.BB_G8
+BLACK_BISHOP_HOMES = chess.BB_C8 | chess.BB_F8
+
+# Pawn structure terms: a bonus per pawn in the central zone, penalties per extra pawn on a
+# file and per isolated pawn, and a bonus for passed pawns by how far they have advanced
+CENTER_PAWN_BONUS = 5
+DOUBLED_PAWN_PENALTY = 15
+ISOLATED_PAWN_PENALTY = 12
+PASSED_PAWN_BONUS = [0, 5, 10, 20, 35, 60, 100, 0]
+ADJACENT_FILES = [(chess.BB_FILES[file - 1] if file > 0 else 0) | (chess.BB_FILES[file + 1] if file < 7 else 0)
+                  for file in range(8)]
+
+# Squares in front of a pawn on its own and the adjacent files: no enemy pawn there means it is passed
+def _passed_pawn_masks(color):
+    masks = []
+    for square in chess.SQUARES:
+        file, rank = chess.square_file(square), chess.square_rank(square)
+        ranks = range(rank + 1, 8) if color == chess.WHITE else range(rank)
+        mask = 0
+        for front_rank in ranks:
+            mask |= chess.BB_RANKS[front_rank]
+        masks.append(mask & (chess.BB_FILES[file] | ADJACENT_FILES[file]))
+    return masks
+
+PASSED_PAWN_MASKS = {color: _passed_pawn_masks(color) for color in chess.COLORS}
+
+# Pawn structure score (White minus Black) from the two pawn bitboards
+def evaluate_pawns(white_pawns, black_pawns):
+    score = CENTER_PAWN_BONUS * ((white_pawns & CENTRAL_PAWN_ZONE).bit_count() - (black_pawns & CENTRAL_PAWN_ZONE).bit_count())
+    for color, own, enemy, sign in ((chess.WHITE, white_pawns, black_pawns, 1), (chess.BLACK, black_pawns, white_pawns, -1)):
+        for file in range(8):
+            on_file = (own & chess.BB_FILES[file]).bit_count()
+            if on_file:
+                score -= sign * DOUBLED_PAWN_PENALTY * (on_file - 1)
+                if not own & ADJACENT_FILES[file]:
+                    score -= sign * ISOLATED_PAWN_PENALTY * on_file
+        passed_masks = PASSED_PAWN_MASKS[color]
+        for square in chess.scan_reversed(own):
+            if not enemy & passed_masks[square]:
+                rank = chess.square_rank(square)
+                score += sign * PASSED_PAWN_BONUS[rank if color == chess.WHITE else 7 - rank]
+    return score
+
+# Direct-mapped cache of evaluate_pawns keyed on the two pawn bitboards. Pawn structure rarely
+# changes between sibling nodes, so most leaves are hits (see probes/hits).
+class PawnHashTable:
+    def __init__(self, size=1 << 14):
+        self.size = size
+        self.mask = size - 1
+        self.clear()
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+
+    def score(self, white_pawns, black_pawns):
+        self.probes += 1
+        # Multiply-shift mixing: Python's tuple hash leaves similar pawn bitboards in few slots
+        index = (((white_pawns ^ black_pawns * 0x9E3779B97F4A7C15) * 0xBF58476D1CE4E5B9) >> 48) & self.mask
+        entry = self.entries[index]
+        if entry is not None and entry[0] == white_pawns and entry[1] == black_pawns:
+            self.hits += 1
+            return entry[2]
+        score = evaluate_pawns(white_pawns, black_pawns)
+        self.entries[index] = (white_pawns, black_pawns, score)
+        return score
+
+pawn_table = PawnHashTable()
+
+# Pseudo-legal mobility from attack bitboards: squares each piece attacks that are not occupied
+# by its own side, plus pawn pushes and captures. No legal move generation or pin checks.
+def attack_mobility(board, color):
+    own = board.occupied_co[color]
+    not_own = ~own
+    occupied = board.occupied
+    mobility = 0
+    
+    for square in chess.scan_reversed(board.knights & own):
+        mobility += (chess.BB_KNIGHT_ATTACKS[square] & not_own).bit_count()
+    for square in chess.scan_reversed((board.bishops | board.queens) & own):
+        mobility += (chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied] & not_own).bit_count()
+    for square in chess.scan_reversed((board.rooks | board.queens) & own):
+        attacks = chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] | \
+                  chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied]
+        mobility += (attacks & not_own).bit_count()
+    for square in chess.scan_reversed(board.kings & own):
+        mobility += (chess.BB_KING_ATTACKS[square] & not_own).bit_count()
+    
+    pawns = board.pawns & own
+    enemy = board.occupied_co[not color]
+    empty = ~occupied & chess.BB_ALL
+    if color == chess.WHITE:
+        single_pushes = (pawns << 8) & empty
+        double_pushes = ((single_pushes & chess.BB_RANK_3) << 8) & empty
+        captures = (((pawns & ~chess.BB_FILE_A) << 7) & enemy).bit_count() + (((pawns & ~chess.BB_FILE_H) << 9) & enemy).bit_count()
+    else:
+        single_pushes = (pawns >> 8) & empty
+        double_pushes = ((single_pushes & chess.BB_RANK_6) >> 8) & empty
+        captures = (((pawns & ~chess.BB_FILE_A) >> 9) & enemy).bit_count() + (((pawns & ~chess.BB_FILE_H) >> 7) & enemy).bit_count()
+    mobility += single_pushes.bit_count() + double_pushes.bit_count() + captures
+    
+    return mobility
+
+# Improved board evaluation
+def evaluate_board(board, difficulty, evaluator=None):
+    try:
+        if board.is_checkmate():
+            return -MATE_SCORE if board.turn == chess.WHITE else MATE_SCORE
+        
+        if board.is_stalemate() or board.is_insufficient_material():
+            return 0
+        
+        return evaluate_position(board, difficulty, evaluator)
+    
+    except Exception as e:
+        print(f"Error in evaluate_board: {str(e)} with board state: {board.fen()}")
+        return 0
+
+# Kings with at most one minor piece left, from the bitboards alone (no move generation)
+def is_bare_material(board):
+    return not (board.pawns | board.rooks | board.queens) and (board.knights | board.bishops).bit_count() <= 1
+
+# Draw by the 50-move rule, from the halfmove clock. Checkmate takes precedence, and is only
+# looked for once the clock has run out. Zobrist keys do not include the clock, so this
+# result must never go into a transposition table.
+def is_fifty_move_draw(board):
+    return board.halfmove_clock >= 100 and not board.is_checkmate()
+
+# Static evaluation (White-relative) without evaluate_board's game-over checks, each of which
+# generates the legal moves again. The search finds mate and stalemate from its own move
+# generation and draws with is_bare_material and is_fifty_move_draw instead.
+def evaluate_position(board, difficulty, evaluator=None):
+    try:
+        if evaluator is not None:
+            score = evaluator.score(difficulty)
+            piece_count = evaluator.piece_count
+        else:
+            score, piece_count = evaluate_material_and_pst(board, difficulty)
+        
+        if difficulty == "hard":
+            score += (attack_mobility(board, chess.WHITE) - attack_mobility(board, chess.BLACK)) * 0.1
+            
+            if board.kings & board.occupied_co[chess.WHITE] & CASTLED_KING_SQUARES[chess.WHITE]:
+                score += 30
+            if board.kings & board.occupied_co[chess.BLACK] & CASTLED_KING_SQUARES[chess.BLACK]:
+                score -= 30
+            
+            # Occupied center squares, plus the pawn structure terms from the pawn hash table
+            white = board.occupied_co[chess.WHITE]
+            black = board.occupied_co[chess.BLACK]
+            score += 10 * ((white & CENTER_SQUARES).bit_count() - (black & CENTER_SQUARES).bit_count())
+            score += pawn_table.score(board.pawns & white, board.pawns & black)
+            
+            if piece_count > 28:
+                # Home squares still holding a knight/bishop of either color count as undeveloped
+                undeveloped_white = (board.knights & WHITE_KNIGHT_HOMES).bit_count() + (board.bishops & WHITE_BISHOP_HOMES).bit_count()
+                undeveloped_black = (board.knights & BLACK_KNIGHT_HOMES).bit_count() + (board.bishops & BLACK_BISHOP_HOMES).bit_count()
+                score += (4 - undeveloped_white) * 10
+                score -= (4 - undeveloped_black) * 10
+        
+        return score
+    
+    except Exception as e:
+        print(f"Error in evaluate_position: {str(e)} with board state: {board.fen()}")
+        return 0
+
+# Order moves by evaluate_move, trying the transposition table's best move first
+def order_moves(board, moves, tt_move=None):
+    move_scores = [(move, evaluate_move(board, move)) for move in moves]
+    sorted_moves = [move for move, score in sorted(move_scores, key=lambda x: -x[1])]
+    if tt_move in sorted_moves:
+        sorted_moves.remove(tt_move)
+        sorted_moves.insert(0, tt_move)
+    return sorted_moves
+
+# Staged move generation for interior nodes: the TT move, then captures by MVV-LVA, then the
+# killer moves of this ply, then the remaining quiet moves by history score. Later stages are
+# only generated if the earlier ones did not cause a cutoff.
+def ordered_moves(board, context, tt_move=None):
+    if tt_move is not None and board.is_legal(tt_move):
+        yield tt_move
+    
+    captures = []
+    for move in board.generate_legal_captures():
+        if move != tt_move:
+            victim = board.piece_type_at(move.to_square) or chess.PAWN
+            score = MVV_LVA[victim][board.piece_type_at(move.from_square)]
+            if move.promotion:
+                score += PROMOTION_BONUS
+            captures.append((score, move))
+    captures.sort(key=lambda x: -x[0])
+    for score, move in captures:
+        yield move
+    
+    killers = context.killers.get(len(board.move_stack) - context.root_ply, ())
+    tried_killers = []
+    for killer in killers:
+        if killer is not None and killer != tt_move and not board.is_capture(killer) and board.is_legal(killer):
+            tried_killers.append(killer)
+            yield killer
+    
+    history = context.history[board.turn]
+    quiets = []
+    for move in board.generate_legal_moves(chess.BB_ALL, ~board.occupied_co[not board.turn]):
+        if move == tt_move or move in tried_killers or board.is_en_passant(move):
+            continue
+        score = history[move.from_square * 64 + move.to_square]
+        if move.promotion == chess.QUEEN:
+            score += 1 << 30
+        quiets.append((score, move))
+    quiets.sort(key=lambda x: -x[0])
+    for score, move in quiets:
+        yield move
+
+# Quiescence search limits: maximum extra plies, and the margin for delta pruning
+QUIESCENCE_MAX_PLY = 8
+DELTA_MARGIN = 200
+
+# Captures (MVV-LVA order) and queen promotions for the quiescence search
+def quiescence_moves(board):
+    moves = []
+    for move in board.generate_legal_captures():
+        victim = board.piece_type_at(move.to_square) or chess.PAWN
+        moves.append((MVV_LVA[victim][board.piece_type_at(move.from_square)] + (PROMOTION_BONUS if move.promotion else 0), victim, move))
+    
+    seventh_rank = chess.BB_RANK_7 if board.turn == chess.WHITE else chess.BB_RANK_2
+    for move in board.generate_legal_moves(board.pawns & board.occupied_co[board.turn] & seventh_rank, ~board.occupied):
+        if move.promotion == chess.QUEEN:
+            moves.append((PROMOTION_BONUS, None, move))
+    
+    moves.sort(key=lambda x: -x[0])
+    return moves
+
+# Quiescence search (negamax: scores are from the side to move's point of view): keep
+# resolving captures and promotions past the horizon so leaves are evaluated in quiet
+# positions. The side to move may stand pat unless it is in check, in which case every
+# evasion is searched and having none is mate. Captures that cannot lift the score back to
+# alpha even with DELTA_MARGIN to spare are skipped (delta pruning). Stalemate is not
+# detected here: a quiet position is scored by the static evaluation.
+def quiescence(board, alpha, beta, difficulty, context, ply=0):
+    context.check()
+    stats = context.stats
+    if stats is not None:
+        stats.qnodes += 1
+    
+    if is_bare_material(board) or is_fifty_move_draw(board):
+        return 0
+    
+    in_check = board.is_check()
+    if in_check:
+        moves = [(0, None, move) for move in ordered_moves(board, context)]
+        if not moves:
+            return -(MATE_SCORE - (len(board.move_stack) - context.root_ply))
+    
+    # A side in check cannot stand pat, so it is only evaluated at the ply limit
+    if not in_check or ply >= QUIESCENCE_MAX_PLY:
+        if stats is not None:
+            stats.eval_calls += 1
+        stand_pat = evaluate_position(board, difficulty, context.evaluator)
+        if board.turn == chess.BLACK:
+            stand_pat = -stand_pat
+        if ply >= QUIESCENCE_MAX_PLY:
+            return stand_pat
+    
+    if in_check:
+        best_score = float('-inf')
+    else:
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        moves = quiescence_moves(board)
+        best_score = stand_pat
+    
+    for order_score, victim, move in moves:
+        if not in_check and not move.promotion and stand_pat + piece_values[victim] + DELTA_MARGIN < alpha:
+            continue
+        
+        make_move(board, move, 0, context.evaluator)
+        score = -quiescence(board, -beta, -alpha, difficulty, context, ply + 1)
+        unmake_move(board, context.evaluator)
+        
+        best_score = max(best_score, score)
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            break
+    
+    return best_score
+
+# Selective search tuning. Aspiration windows are ASPIRATION_WINDOW either side of the previous
+# iteration's score from ASPIRATION_MIN_DEPTH on. Null-move searches are NULL_MOVE_REDUCTION
+# plies shallower and only tried from NULL_MOVE_MIN_DEPTH. Late-move reductions take one ply off
+# quiet moves after the first LMR_MIN_MOVES (two from LMR_DEEP_MOVES on) at LMR_MIN_DEPTH or more.
+ASPIRATION_WINDOW = 50
+ASPIRATION_MIN_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+LMR_DEEP_MOVES = 8
+LMR_MIN_DEPTH = 3
+
+# Negamax alpha-beta with a transposition table; scores are from the side to move's point of
+# view. Each selective part can be switched off through the context attribute of its name:
+# check_extensions (a node in check is searched one ply deeper), null_move (pass, and prune
+# if a shallower search still fails high; skipped when the side to move has only pawns, where
+# zugzwang is common), pvs (null-window searches after the first move, re-searched when they
+# beat alpha) and lmr (late quiet moves searched shallower first).
+def negamax(board, depth, alpha, beta, difficulty, key=None, context=None, null_move=True):
+    if key is None:
+        key = search_key(board, difficulty)
+    if context is None:
+        context = SearchContext()
+        context.root_ply = len(board.move_stack)
+    
+    try:
+        context.check()
+        stats = context.stats
+        ply = len(board.move_stack) - context.root_ply
+        
+        tt_move = None
+        entry = transposition_table.probe(key)
+        if stats is not None:
+            stats.nodes += 1
+            stats.tt_probes += 1
+            stats.tt_hits += entry is not None
+        # Checked before the table entry is used, as the entry may come from the same position
+        # at a lower halfmove clock; and not stored, for the same reason
+        if is_fifty_move_draw(board):
+            return 0
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                score, bound = score_from_tt(entry[2], ply), entry[3]
+                if bound == TT_EXACT or \
+                   (bound == TT_LOWER and score >= beta) or \
+                   (bound == TT_UPPER and score <= alpha):
+                    return score
+        
+        tablebase = context.tablebase
+        if tablebase is not None and not board.castling_rights and \
+           board.occupied.bit_count() <= tablebase.probe_pieces:
+            wdl = tablebase.probe_wdl(board, key)
+            if wdl is not None:
+                score = tablebase.score(wdl)
+                transposition_table.store(key, depth, score, TT_EXACT)
+                if stats is not None:
+                    stats.tb_hits += 1
+                    stats.tt_stores += 1
+                return score
+        
+        if is_bare_material(board):
+            transposition_table.store(key, depth, 0, TT_EXACT)
+            if stats is not None:
+                stats.tt_stores += 1
+            return 0
+        
+        in_check = board.is_check()
+        # Extensions stop at twice the iteration depth, so checking sequences cannot run away
+        if in_check and context.check_extensions and len(board.move_stack) - context.root_ply < 2 * context.root_depth:
+            depth += 1
+        
+        alpha_orig = alpha
+        best_move = None
+        
+        if depth <= 0:
+            best_score = quiescence(board, alpha, beta, difficulty, context)
+        else:
+            if context.null_move and null_move and not in_check and depth >= NULL_MOVE_MIN_DEPTH and \
+               beta < MATE_THRESHOLD and board.occupied_co[board.turn] & ~(board.pawns | board.kings):
+                null_key = make_null_move(board, key, context.evaluator)
+                score = -negamax(board, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, difficulty, null_key,
+                                 context, False)
+                unmake_move(board, context.evaluator)
+                if score >= beta:
+                    if stats is not None:
+                        stats.null_cutoffs += 1
+                    # A mate found after passing is not a real mate
+                    return beta if score >= MATE_THRESHOLD else score
+            
+            best_score = float('-inf')
+            for move_number, move in enumerate(ordered_moves(board, context, tt_move)):
+                quiet = not move.promotion and not board.is_capture(move)
+                child_key = make_move(board, move, key, context.evaluator)
+                if move_number == 0:
+                    score = -negamax(board, depth - 1, -beta, -alpha, difficulty, child_key, context)
+                else:
+                    reduction = 0
+                    if context.lmr and quiet and move_number >= LMR_MIN_MOVES and depth >= LMR_MIN_DEPTH and \
+                       not in_check and not board.is_check():
+                        reduction = 2 if move_number >= LMR_DEEP_MOVES else 1
+                    window = -alpha - 1 if context.pvs else -beta
+                    score = -negamax(board, depth - 1 - reduction, window, -alpha, difficulty, child_key, context)
+                    if reduction and score > alpha:
+                        if stats is not None:
+                            stats.researches += 1
+                        score = -negamax(board, depth - 1, window, -alpha, difficulty, child_key, context)
+                    if context.pvs and alpha < score < beta:
+                        if stats is not None:
+                            stats.researches += 1
+                        score = -negamax(board, depth - 1, -beta, -alpha, difficulty, child_key, context)
+                    if stats is not None and reduction:
+                        stats.reductions += 1
+                unmake_move(board, context.evaluator)
+                
+                if score > best_score:
+                    best_score = score
+                    best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        context.record_cutoff(board, move, depth)
+                        if stats is not None:
+                            stats.beta_cutoffs += 1
+                            stats.first_move_cutoffs += move_number == 0
+                        break
+            
+            # No legal moves: checkmate or stalemate, found without generating the moves again
+            if best_score == float('-inf'):
+                score = -(MATE_SCORE - ply) if in_check else 0
+                transposition_table.store(key, depth, score_to_tt(score, ply), TT_EXACT)
+                if stats is not None:
+                    stats.tt_stores += 1
+                return score
+        
+        if best_score <= alpha_orig:
+            bound = TT_UPPER
+        elif best_score >= beta:
+            bound = TT_LOWER
+        else:
+            bound = TT_EXACT
+        transposition_table.store(key, depth, score_to_tt(best_score, ply), bound, best_move)
+        if stats is not None:
+            stats.tt_stores += 1
+        return best_score
+    
+    except SearchAborted:
+        raise
+    except Exception as e:
+        print(f"Error in negamax (depth: {depth}): {str(e)} with board state: {board.fen()}")
+        score = evaluate_board(board, difficulty)
+        return score if board.turn == chess.WHITE else -score
+
+# Score one root move with a search of depth plies (the root move included). alpha, beta and
+# the score are White-relative, as ParallelSearch compares them across root moves.
+def search_root_move(board, move, root_key, depth, alpha, beta, difficulty, context):
+    context.root_depth = depth
+    child_key = make_move(board, move, root_key, context.evaluator)
+    if board.turn == chess.BLACK:
+        score = -negamax(board, depth - 1, -beta, -alpha, difficulty, child_key, context)
+    else:
+        score = negamax(board, depth - 1, alpha, beta, difficulty, child_key, context)
+    unmake_move(board, context.evaluator)
+    return score
+
+# Search the root moves in order with principal variation search (when context.pvs). Scores
+# are from the side to move's point of view, and moves after a beta cutoff are left unscored.
+# Returns the best score and a dict of the scores.
+def search_root(board, root_moves, root_key, depth, alpha, beta, difficulty, context):
+    context.root_depth = depth
+    scores = {}
+    best_score = float('-inf')
+    for move_number, move in enumerate(root_moves):
+        child_key = make_move(board, move, root_key, context.evaluator)
+        if move_number == 0 or not context.pvs:
+            score = -negamax(board, depth - 1, -beta, -alpha, difficulty, child_key, context)
+        else:
+            score = -negamax(board, depth - 1, -alpha - 1, -alpha, difficulty, child_key, context)
+            if alpha < score < beta:
+                score = -negamax(board, depth - 1, -beta, -alpha, difficulty, child_key, context)
+        unmake_move(board, context.evaluator)
+        scores[move] = score
+        best_score = max(best_score, score)
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            break
+    return best_score, scores
+
+# Principal variation: first_move followed by the best moves stored in the transposition table
+# by a search at this difficulty
+def principal_variation(board, first_move, max_length, difficulty, table=None):
+    if table is None:
+        table = transposition_table
+    pv = [first_move]
+    key = make_move(board, first_move, search_key(board, difficulty))
+    while len(pv) < max_length:
+        entry = table.probe(key)
+        if entry is None or entry[4] is None or not board.is_legal(entry[4]):
+            break
+        pv.append(entry[4])
+        key = make_move(board, entry[4], key)
+    for move in pv:
+        board.pop()
+    return pv
+
+# Pass the result of a completed iteration to context.on_iteration, if set
+def report_iteration(board, context, depth, score, best_move, difficulty, table=None):
+    elapsed = time.monotonic() - context.start_time
+    stats_record = context.stats.end_iteration(depth, elapsed) if context.stats is not None else None
+    if context.on_iteration is None:
+        return
+    info = {
+        "depth": depth,
+        "score": score,
+        "nodes": context.nodes,
+        "time": elapsed,
+        "pv": principal_variation(board, best_move, depth, difficulty, table),
+    }
+    if stats_record is not None:
+        info["stats"] = stats_record
+    context.on_iteration(info)
+
+# Iterative deepening: search 1, 2, ... max_depth plies until the time/node budget runs out,
+# ordering the root by the previous iteration's scores. With context.aspiration, iterations
+# start with a window around the previous score and reopen the side that fails. Returns the
+# best move of the last completed iteration; SearchAborted only escapes when the search was
+# cancelled. Reported scores are White-relative.
+def iterative_deepening(board, difficulty, max_depth, context):
+    transposition_table.new_search()
+    root_key = search_key(board, difficulty)
+    stack_size = len(board.move_stack)
+    context.root_ply = stack_size
+    sign = 1 if board.turn == chess.WHITE else -1
+    root_moves = order_moves(board, list(board.legal_moves))
+    best_move = root_moves[0]
+    best_score = None
+    context.evaluator = IncrementalEvaluator(board)
+    
+    for depth in range(1, max_depth + 1):
+        alpha = float('-inf')
+        beta = float('inf')
+        if context.aspiration and best_score is not None and depth >= ASPIRATION_MIN_DEPTH:
+            alpha, beta = best_score - ASPIRATION_WINDOW, best_score + ASPIRATION_WINDOW
+        try:
+            while True:
+                score, scores = search_root(board, root_moves, root_key, depth, alpha, beta, difficulty, context)
+                if score <= alpha:
+                    alpha = float('-inf')
+                elif score >= beta:
+                    beta = float('inf')
+                else:
+                    break
+        except SearchAborted:
+            while len(board.move_stack) > stack_size:
+                unmake_move(board, context.evaluator)
+            if context.is_cancelled():
+                raise
+            break
+        
+        root_moves.sort(key=lambda move: scores.get(move, float('-inf')), reverse=True)
+        best_move = root_moves[0]
+        best_score = scores[best_move]
+        report_iteration(board, context, depth, sign * best_score, best_move, difficulty)
+        if abs(best_score) >= MATE_THRESHOLD:
+            break
+    
+    return best_move
+
+# Per-process state of parallel search workers, set up by _init_search_worker
+_search_worker = {}
+
+def _init_search_worker(shm_name, tt_size, stop_event):
+    global transposition_table
+    from multiprocessing import shared_memory
+    if shm_name is not None:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _search_worker["shm"] = shm
+        transposition_table = SharedTranspositionTable(shm.buf, tt_size)
+    _search_worker["stop_event"] = stop_event
+
+# Worker task: score one root move. Returns (move, score, nodes, stats), score None if aborted
+# and stats a SearchStats only when collect_stats is set.
+# Deterministic tasks use a fresh private table so the result does not depend on scheduling.
+def _search_root_move_task(board, move, depth, alpha, beta, difficulty, generation, deadline, deterministic,
+                           collect_stats=False, use_tablebase=False, features=None):
+    global transposition_table
+    if deterministic:
+        transposition_table = TranspositionTable()
+    transposition_table.generation = generation
+    
+    # Tasks of one chunk share the unpickled board, and an aborted search leaves moves pushed
+    board = board.copy()
+    context = SearchContext(_search_worker["stop_event"], SearchStats() if collect_stats else None)
+    context.deadline = deadline
+    context.tablebase = get_tablebase() if use_tablebase else None
+    for name, enabled in (features or {}).items():
+        setattr(context, name, enabled)
+    context.root_ply = len(board.move_stack)
+    context.evaluator = IncrementalEvaluator(board)
+    try:
+        score = search_root_move(board, move, search_key(board, difficulty), depth, alpha, beta, difficulty, context)
+    except SearchAborted:
+        score = None
+    return move, score, context.nodes, context.stats
+
+# Root-splitting parallel search over a multiprocessing pool. Each iteration searches the
+# first root move on its own to get a bound, then the remaining root moves in parallel against
+# that bound; moves that beat it come back with exact scores. Workers share one transposition
+# table in shared memory unless deterministic is set. Deterministic searches also switch off every
+# SEARCH_FEATURES entry: null move, LMR and PVS depend on the window each root move is searched
+# with, and check extensions on what the table already holds, so with them a root move split
+# off on its own can score differently than in iterative_deepening. With them off the best move
+# is the one iterative_deepening finds with them off too (see report_parallel_speedup).
+# The default shared-table mode keeps the context's features and may pick a different move
+# than iterative_deepening: its root moves are not searched with search_root's PVS and
+# aspiration windows, and what the shared table holds depends on the workers' timing.
+class ParallelSearch:
+    def __init__(self, workers, deterministic=False, tt_size=1 << 17):
+        import multiprocessing
+        from multiprocessing import shared_memory
+        mp_context = multiprocessing.get_context()
+        self.workers = workers
+        self.deterministic = deterministic
+        self.stop_event = mp_context.Event()
+        self.shm = None
+        self.table = None
+        if not deterministic:
+            self.shm = shared_memory.SharedMemory(create=True, size=SharedTranspositionTable.bytes_needed(tt_size))
+            self.shm.buf[:self.shm.size] = bytes(self.shm.size)
+            self.table = SharedTranspositionTable(self.shm.buf, tt_size)
+        self.generation = 0
+        self.pool = mp_context.Pool(workers, initializer=_init_search_worker,
+                                    initargs=(self.shm.name if self.shm else None, tt_size, self.stop_event))
+    
+    def close(self):
+        self.stop_event.set()
+        self.pool.close()
+        self.pool.join()
+        if self.shm is not None:
+            self.table = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+    
+    # Run tasks on the pool, returning their results or None if any was aborted
+    def _run(self, tasks, context):
+        pending = self.pool.starmap_async(_search_root_move_task, tasks)
+        while not pending.ready():
+            pending.wait(0.02)
+            if context.is_cancelled() or (context.deadline and time.monotonic() >= context.deadline):
+                self.stop_event.set()
+        results = pending.get()
+        for move, score, nodes, stats in results:
+            context.nodes += nodes
+            if stats is not None:
+                context.stats.merge(stats)
+        if context.is_cancelled():
+            raise SearchAborted()
+        if any(score is None for move, score, nodes, stats in results):
+            return None
+        return results
+    
+    def search(self, board, difficulty, max_depth, context):
+        self.stop_event.clear()
+        self.generation += 1
+        maximizing = board.turn == chess.WHITE
+        root_moves = order_moves(board, list(board.legal_moves))
+        best_move = root_moves[0]
+        features = {name: getattr(context, name) and not self.deterministic for name in SEARCH_FEATURES}
+        
+        for depth in range(1, max_depth + 1):
+            task = lambda move, alpha, beta: (board, move, depth, alpha, beta, difficulty, self.generation,
+                                              context.deadline, self.deterministic, context.stats is not None,
+                                              context.tablebase is not None, features)
+            first = self._run([task(root_moves[0], float('-inf'), float('inf'))], context)
+            if first is None:
+                break
+            bound = first[0][1]
+            if maximizing:
+                rest = self._run([task(move, bound, float('inf')) for move in root_moves[1:]], context)
+            else:
+                rest = self._run([task(move, float('-inf'), bound) for move in root_moves[1:]], context)
+            if rest is None:
+                break
+            
+            scores = {move: score for move, score, nodes, stats in first + rest}
+            root_moves.sort(key=lambda move: scores[move], reverse=maximizing)
+            best_move = root_moves[0]
+            report_iteration(board, context, depth, scores[best_move], best_move, difficulty, self.table)
+            if abs(scores[best_move]) >= MATE_THRESHOLD:
+                break
+        
+        return best_move
+
+# One ParallelSearch pool per worker count, created on first use and closed at exit
+_parallel_searches = {}
+
+def get_parallel_search(workers):
+    if workers not in _parallel_searches:
+        _parallel_searches[workers] = ParallelSearch(workers)
+    return _parallel_searches[workers]
+
+@atexit.register
+def _close_parallel_searches():
+    for search in _parallel_searches.values():
+        search.close()
+    _parallel_searches.clear()
+
+# Time a fixed-depth search of each position with iterative_deepening and with a ParallelSearch
+# of `workers` workers, and print the speedup. In deterministic mode both search with every
+# SEARCH_FEATURES entry off and must agree on every move; otherwise both keep the features and
+# the parallel search shares its table, so moves may differ. Returns the speedup and a list of
+# (fen, serial_move, parallel_move) for the positions where they differ.
+def report_parallel_speedup(fens, workers, difficulty="hard", depth=4, deterministic=True):
+    start = time.perf_counter()
+    serial_moves = []
+    for fen in fens:
+        transposition_table.clear()
+        context = SearchContext()
+        for name in SEARCH_FEATURES:
+            setattr(context, name, not deterministic)
+        serial_moves.append(iterative_deepening(chess.Board(fen), difficulty, depth, context))
+    serial_time = time.perf_counter() - start
+    
+    search = ParallelSearch(workers, deterministic=deterministic)
+    try:
+        start = time.perf_counter()
+        parallel_moves = [search.search(chess.Board(fen), difficulty, depth, SearchContext()) for fen in fens]
+        parallel_time = time.perf_counter() - start
+    finally:
+        search.close()
+    
+    mismatches = [(fen, serial_move, parallel_move) for fen, serial_move, parallel_move
+                  in zip(fens, serial_moves, parallel_moves) if serial_move != parallel_move]
+    print(f"serial: {serial_time:.2f}s, {workers} workers: {parallel_time:.2f}s, "
+          f"speedup {serial_time / parallel_time:.2f}x, same moves: {len(fens) - len(mismatches)}/{len(fens)}")
+    for fen, serial_move, parallel_move in mismatches:
+        print(f"  {fen}: serial {serial_move.uci()}, parallel {parallel_move.uci()}")
+    return serial_time / parallel_time, mismatches
+
+# Polyglot opening book, opened on first use. python-chess's reader memory-maps the .bin file
+# and binary-searches its sorted entries for the position's Zobrist key, so nothing is loaded
+# up front. A missing file just disables the book.
+OPENING_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "book.bin")
+_opening_book = {}
+
+def get_opening_book(path=None):
+    path = path or OPENING_BOOK_PATH
+    if path not in _opening_book:
+        try:
+            _opening_book[path] = chess.polyglot.open_reader(path)
+        except (OSError, ValueError):
+            _opening_book[path] = None
+    return _opening_book[path]
+
+# Book move for board, or None when out of book or past the difficulty's book_depth
+def book_move(board, difficulty, path=None):
+    settings = DIFFICULTY_SETTINGS.get(difficulty)
+    if settings is None or board.ply() >= settings.get("book_depth", 0):
+        return None
+    book = get_opening_book(path)
+    if book is None:
+        return None
+    entries = [entry for entry in book.find_all(board) if board.is_legal(entry.move)]
+    if not entries:
+        return None
+    power = settings.get("book_weight_power", 1)
+    weights = [entry.weight ** power for entry in entries]
+    if not any(weights):
+        return random.choice(entries).move
+    return random.choices(entries, weights)[0].move
+
+# Syzygy endgame tablebases (.rtbw/.rtbz files), opened on first use. A missing or empty
+# directory disables probing. chess.syzygy is imported here because it is slow to import.
+SYZYGY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "syzygy")
+# The search probes positions with at most this many pieces (capped by the largest table found)
+SYZYGY_PROBE_LIMIT = 6
+SYZYGY_CACHE_SIZE = 1 << 16
+_tablebases = {}
+
+# Tablebase probes for the search and the root. WDL results are kept in an LRU cache keyed by
+# the position's Zobrist key, since the search reaches the same endgame positions again and again.
+class SyzygyTablebase:
+    def __init__(self, tablebase, cache_size=SYZYGY_CACHE_SIZE):
+        self.tablebase = tablebase
+        # Table names look like "KRPvKR": one letter per piece plus the "v"
+        self.max_pieces = max(len(name) - 1 for name in tablebase.wdl)
+        self.probe_pieces = min(self.max_pieces, SYZYGY_PROBE_LIMIT)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+    
+    # Win/draw/loss for the side to move (2 win, 1 cursed win, 0 draw, -1 blessed loss, -2 loss),
+    # or None if the table is missing
+    def probe_wdl(self, board, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        try:
+            wdl = self.tablebase.probe_wdl(board)
+        except KeyError:
+            wdl = None
+        self.cache[key] = wdl
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return wdl
+    
+    # Search score of a WDL result for the side to move. Cursed wins and blessed losses are
+    # draws under the 50-move rule.
+    def score(self, wdl):
+        if wdl == 2:
+            return TB_WIN_SCORE
+        if wdl == -2:
+            return -TB_WIN_SCORE
+        return 0
+    
+    # DTZ-optimal root move: the best WDL outcome, then in a win the fewest plies to the next
+    # zeroing move (a winning capture or pawn move counts as 1), in a loss the most.
+    # None when the position is not in the tables.
+    def root_move(self, board):
+        if board.castling_rights or board.occupied.bit_count() > self.max_pieces:
+            return None
+        best_move = None
+        best_rank = None
+        for move in board.legal_moves:
+            zeroing = board.is_zeroing(move)
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    return move
+                wdl = -self.tablebase.probe_wdl(board)
+                dtz = 1 if zeroing else abs(self.tablebase.probe_dtz(board))
+            except KeyError:
+                return None
+            finally:
+                board.pop()
+            if wdl > 0:
+                rank = (wdl, -dtz)
+            elif wdl < 0:
+                rank = (wdl, dtz)
+            else:
+                rank = (0, 0)
+            if best_rank is None or rank > best_rank:
+                best_move, best_rank = move, rank
+        return best_move
+
+def get_tablebase(path=None):
+    path = path or SYZYGY_PATH
+    if path not in _tablebases:
+        try:
+            import chess.syzygy
+            tablebase = chess.syzygy.open_tablebase(path)
+            _tablebases[path] = SyzygyTablebase(tablebase) if tablebase.wdl else None
+        except (OSError, ValueError):
+            _tablebases[path] = None
+    return _tablebases[path]
+
+# AI move with error handling
+def make_ai_move(board, difficulty, context=None, time_limit=None, node_limit=None, max_depth=None, workers=None,
+                 use_book=True, use_tablebase=True):
+    if context is None:
+        context = SearchContext()
+    
+    if board.is_game_over():
+        return None
+    
+    legal_moves = list(board.legal_moves)
+    if not legal_moves:
+        print("Error: No legal moves available!")
+        return None
+    
+    try:
+        if difficulty == "easy":
+            captures = [move for move in legal_moves if board.is_capture(move)]
+            if captures and random.random() < 0.7:
+                move = random.choice(captures)
+            else:
+                move = random.choice(legal_moves)
+            return move
+        
+        if use_book:
+            move = book_move(board, difficulty)
+            if move is not None:
+                return move
+        
+        context.tablebase = get_tablebase() if use_tablebase else None
+        if context.tablebase is not None:
+            move = context.tablebase.root_move(board)
+            if move is not None:
+                return move
+        
+        settings = DIFFICULTY_SETTINGS[difficulty]
+        if max_depth is None:
+            max_depth = settings["max_depth"]
+        if time_limit is None:
+            time_limit = settings["time_limit"]
+        if workers is None:
+            workers = settings.get("workers", 1)
+        context.start(time_limit, node_limit)
+        if workers > 1:
+            return get_parallel_search(workers).search(board, difficulty, max_depth, context)
+        return iterative_deepening(board, difficulty, max_depth, context)
+    
+    except SearchAborted:
+        print(f"AI search cancelled (difficulty: {difficulty})")
+        return None
+    except Exception as e:
+        print(f"Error in make_ai_move (difficulty: {difficulty}): {str(e)} with board state: {board.fen()}")
+        return None
+
+# Runs make_ai_move on a background thread so play_game keeps rendering while the AI thinks
+class AIWorker:
+    # With log_stats, every search collects SearchStats and logs each iteration. on_done, if
+    # given, is called without arguments from the worker thread whenever a search finishes.
+    def __init__(self, log_stats=False, on_done=None):
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.context = None
+        self.log_stats = log_stats
+        self.on_done = on_done
+        # Principal variation of the last search, and the FEN searched while pondering
+        self.pv = []
+        self.ponder_fen = None
+    
+    def _submit(self, board, difficulty, pondering=False):
+        self.cancel()
+        context = SearchContext(stats=SearchStats(log=True) if self.log_stats else None)
+        context.pondering = pondering
+        def record_pv(info):
+            if self.context is context:
+                self.pv = info["pv"]
+        context.on_iteration = record_pv
+        self.context = context
+        self.pv = []
+        self.future = self.executor.submit(make_ai_move, board.copy(), difficulty, context)
+        if self.on_done is not None:
+            self.future.add_done_callback(lambda future: self.on_done())
+    
+    def start(self, board, difficulty):
+        self._submit(board, difficulty)
+    
+    # Expected reply to the AI's last move (the second move of its PV), or None
+    def ponder_move(self, board):
+        if len(self.pv) >= 2 and board.move_stack and board.peek() == self.pv[0] and board.is_legal(self.pv[1]):
+            return self.pv[1]
+        return None
+    
+    # Search the position after the expected reply while the opponent thinks. The search has no
+    # time limit until ponder_hit(); its result is not reported by is_done() before then.
+    def ponder(self, board, move, difficulty):
+        ponder_board = board.copy()
+        ponder_board.push(move)
+        self._submit(ponder_board, difficulty, pondering=True)
+        self.ponder_fen = ponder_board.fen()
+    
+    def is_pondering(self):
+        return self.ponder_fen is not None
+    
+    # Call once the opponent has moved. On a hit the ponder search becomes the real search
+    # (finished already, or continuing on the normal time limit) and True is returned. On a
+    # miss it is cancelled, leaving its transposition table entries for the next search.
+    def ponder_hit(self, board):
+        if self.ponder_fen is None:
+            return False
+        if board.fen() == self.ponder_fen:
+            self.ponder_fen = None
+            self.context.ponderhit()
+            return True
+        self.cancel()
+        return False
+    
+    def is_idle(self):
+        return self.future is None
+    
+    def is_done(self):
+        return self.future is not None and self.ponder_fen is None and self.future.done()
+    
+    def result(self):
+        move = self.future.result()
+        self.future = None
+        self.context = None
+        return move
+    
+    def cancel(self):
+        if self.context:
+            self.context.cancel()
+        self.future = None
+        self.context = None
+        self.ponder_fen = None
+    
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
@@ -1,21 +1,26 @@
 import pygame
 import chess
 import sys
-import time
 import random
 import os
-
-# Initialize Pygame
-pygame.init()
-pygame.mixer.init()
+from collections import OrderedDict
+from chess_engine import AIWorker, use_persistent_table
 
 # Constants
 WIDTH, HEIGHT = 640, 640
 INFO_HEIGHT = 60
 LOG_WIDTH = 200
 SQUARE_SIZE = WIDTH // 8
-screen = pygame.display.set_mode((WIDTH + LOG_WIDTH, HEIGHT + INFO_HEIGHT))
-pygame.display.set_caption("Chess Game")
+
+# Set CHESS_SEARCH_STATS=1 to log per-iteration search statistics of the AI as JSON lines
+LOG_SEARCH_STATS = bool(os.environ.get("CHESS_SEARCH_STATS"))
+# Let the AI search the expected reply while the human thinks; CHESS_PONDER=0 turns it off
+PONDERING = os.environ.get("CHESS_PONDER", "1") != "0"
+# Optional file for a transposition table kept across sessions
+TT_FILE = os.environ.get("CHESS_TT_FILE")
+
+# Display surface, created by init_display()
+screen = None
 
 # Colors
 LIGHT_SQUARE = pygame.Color(240, 217, 181)
@@ -31,18 +36,68 @@ MENU_BG_COLOR = pygame.Color(40, 40, 40)
 TITLE_COLOR = pygame.Color(255, 215, 0)
 LOG_BG_COLOR = pygame.Color(30, 30, 30)
 
-# Sounds
-try:
-    MOVE_SOUND = pygame.mixer.Sound("assets/move-self.wav")
-    CAPTURE_SOUND = pygame.mixer.Sound("assets/capture.wav")
-    CASTLE_SOUND = pygame.mixer.Sound("assets/castle.wav")
-    CHECK_SOUND = pygame.mixer.Sound("assets/move-check.wav")
-except:
-    print("Warning: Sound files not found. Game will run without sound effects.")
-    MOVE_SOUND = None
-    CAPTURE_SOUND = None
-    CASTLE_SOUND = None
-    CHECK_SOUND = None
+# Sounds, loaded by init_display()
+MOVE_SOUND = None
+CAPTURE_SOUND = None
+CASTLE_SOUND = None
+CHECK_SOUND = None
+
+# Custom events: AI_START_EVENT fires once the pause before an AI move is over, AI_DONE_EVENT
+# is posted from the AIWorker thread when a search finishes, GAME_OVER_EVENT ends the pause
+# before the result screen and NOTICE_EVENT ends the display of a menu notification
+AI_START_EVENT = pygame.USEREVENT + 1
+AI_DONE_EVENT = pygame.USEREVENT + 2
+GAME_OVER_EVENT = pygame.USEREVENT + 3
+NOTICE_EVENT = pygame.USEREVENT + 4
+AI_MOVE_DELAY_MS = 500
+GAME_OVER_DELAY_MS = 1000
+NOTICE_DELAY_MS = 1500
+
+# Initialize Pygame, open the window and load the sounds. Called from main(), so importing
+# this module does not touch the display or audio device.
+def init_display():
+    global screen, MOVE_SOUND, CAPTURE_SOUND, CASTLE_SOUND, CHECK_SOUND
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH + LOG_WIDTH, HEIGHT + INFO_HEIGHT))
+    pygame.display.set_caption("Chess Game")
+    
+    try:
+        pygame.mixer.init()
+        MOVE_SOUND = pygame.mixer.Sound("assets/move-self.wav")
+        CAPTURE_SOUND = pygame.mixer.Sound("assets/capture.wav")
+        CASTLE_SOUND = pygame.mixer.Sound("assets/castle.wav")
+        CHECK_SOUND = pygame.mixer.Sound("assets/move-check.wav")
+    except:
+        print("Warning: Sound files not found. Game will run without sound effects.")
+        MOVE_SOUND = None
+        CAPTURE_SOUND = None
+        CASTLE_SOUND = None
+        CHECK_SOUND = None
+
+# Fonts by (name, size, bold), created on first use so SysFont's font file lookup runs only once
+fonts = {}
+def get_font(size, bold=False, name="arial"):
+    key = (name, size, bold)
+    font = fonts.get(key)
+    if font is None:
+        font = fonts[key] = pygame.font.SysFont(name, size, bold=bold)
+    return font
+
+# Rendered text surfaces keyed on (text, font, color); the least recently used are dropped
+# once the cache holds TEXT_CACHE_SIZE surfaces. Cached surfaces are shared, only blit them.
+TEXT_CACHE_SIZE = 256
+text_cache = OrderedDict()
+def render_text(text, size, color, bold=False):
+    key = (text, size, bold, tuple(color))
+    surf = text_cache.get(key)
+    if surf is not None:
+        text_cache.move_to_end(key)
+        return surf
+    surf = get_font(size, bold).render(text, True, color)
+    text_cache[key] = surf
+    if len(text_cache) > TEXT_CACHE_SIZE:
+        text_cache.popitem(last=False)
+    return surf
 
 # Load piece images
 images = {}
@@ -57,8 +112,7 @@ def load_images():
                 )
             except FileNotFoundError:
                 img = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                font = pygame.font.SysFont("arial", 36)
-                text = font.render(name, True, pygame.Color("black") if color == 'w' else pygame.Color("white"))
+                text = render_text(name, 36, pygame.Color("black") if color == 'w' else pygame.Color("white"))
                 img.fill(pygame.Color("white") if color == 'w' else pygame.Color("black"))
                 img.blit(text, (SQUARE_SIZE//2 - text.get_width()//2, SQUARE_SIZE//2 - text.get_height()//2))
                 images[name] = img
@@ -71,7 +125,7 @@ class Button:
         self.text = text
         self.color = color
         self.hover_color = hover_color
-        self.font = pygame.font.SysFont("arial", font_size)
+        self.font_size = font_size
         self.is_hovered = False
         
     def draw(self, surface):
@@ -79,7 +133,7 @@ class Button:
         pygame.draw.rect(surface, color, self.rect)
         pygame.draw.rect(surface, TEXT_COLOR, self.rect, 2)
         
-        text_surf = self.font.render(self.text, True, TEXT_COLOR)
+        text_surf = render_text(self.text, self.font_size, TEXT_COLOR)
         text_rect = text_surf.get_rect(center=self.rect.center)
         surface.blit(text_surf, text_rect)
         
@@ -92,6 +146,35 @@ class Button:
                 return True
         return False
 
+# Sleep until at least one event arrives, then return it together with everything else queued
+def wait_events():
+    return [pygame.event.wait()] + pygame.event.get()
+
+# Sleep until a one-shot timer posts event_type after delay_ms; False if the window is closed first
+def wait_for_timer(event_type, delay_ms):
+    pygame.time.set_timer(event_type, delay_ms, loops=1)
+    while True:
+        for event in wait_events():
+            if event.type == pygame.QUIT:
+                pygame.time.set_timer(event_type, 0)
+                return False
+            if event.type == event_type:
+                return True
+
+# Update the hover state of buttons from the mouse position; True if any of them changed
+def update_hover(buttons):
+    mouse_pos = pygame.mouse.get_pos()
+    changed = False
+    for b in buttons:
+        was_hovered = b.is_hovered
+        b.update(mouse_pos)
+        changed = changed or b.is_hovered != was_hovered
+    return changed
+
+# Menus only repaint when a button's hover state changed or something other than mouse motion happened
+def needs_redraw(buttons, events):
+    return update_hover(buttons) or any(event.type != pygame.MOUSEMOTION for event in events)
+
 # Main menu screen
 def show_main_menu():
     button_width, button_height = 300, 60
@@ -106,24 +189,25 @@ def show_main_menu():
     buttons = [human_vs_ai_button, ai_vs_ai_button, exit_button]
 
     running = True
+    redraw = True
+    update_hover(buttons)
     while running:
-        screen.fill(MENU_BG_COLOR)
-        # title cũng căn giữa
-        font_title = pygame.font.SysFont("arial", 48, bold=True)
-        title_text = font_title.render("Chess Game", True, TITLE_COLOR)
-        screen.blit(title_text, (total_w//2 - title_text.get_width()//2, 100))
-        # version nằm ngay dưới và cũng căn giữa
-        font_version = pygame.font.SysFont("arial", 18)
-        version_text = font_version.render("v1.1", True, TEXT_COLOR)
-        screen.blit(version_text, (total_w//2 - version_text.get_width()//2, HEIGHT + INFO_HEIGHT - version_text.get_height() - 10))
+        if redraw:
+            screen.fill(MENU_BG_COLOR)
+            # title cũng căn giữa
+            title_text = render_text("Chess Game", 48, TITLE_COLOR, bold=True)
+            screen.blit(title_text, (total_w//2 - title_text.get_width()//2, 100))
+            # version nằm ngay dưới và cũng căn giữa
+            version_text = render_text("v1.1", 18, TEXT_COLOR)
+            screen.blit(version_text, (total_w//2 - version_text.get_width()//2, HEIGHT + INFO_HEIGHT - version_text.get_height() - 10))
 
-        mouse_pos = pygame.mouse.get_pos()
-        for b in buttons:
-            b.update(mouse_pos)
-            b.draw(screen)
-        pygame.display.flip()
+            for b in buttons:
+                b.draw(screen)
+            pygame.display.flip()
         
-        for event in pygame.event.get():
+        events = wait_events()
+        redraw = needs_redraw(buttons, events)
+        for event in events:
             if event.type == pygame.QUIT:
                 return None, None
             
@@ -139,12 +223,11 @@ def show_main_menu():
                 if ai_color == "back" or ai_color is None:
                     selected_mode = None
                     ai_color = None
+                    redraw = True
                     continue
                 running = False
             elif exit_button.handle_event(event):
                 return None, None
-        
-        pygame.time.Clock().tick(60)
     
     return selected_mode, ai_color
 
@@ -161,18 +244,20 @@ def show_color_selection(title="Select Your Color"):
     buttons = [white_button, black_button, random_button, back_button]
 
     running = True
+    redraw = True
+    update_hover(buttons)
     while running:
-        screen.fill(MENU_BG_COLOR)
-        font_title = pygame.font.SysFont("arial", 48, bold=True)
-        title_text = font_title.render(title, True, TITLE_COLOR)
-        screen.blit(title_text, (total_w//2 - title_text.get_width()//2, 100))
-        mouse_pos = pygame.mouse.get_pos()
-        for b in buttons:
-            b.update(mouse_pos)
-            b.draw(screen)
-        pygame.display.flip()
+        if redraw:
+            screen.fill(MENU_BG_COLOR)
+            title_text = render_text(title, 48, TITLE_COLOR, bold=True)
+            screen.blit(title_text, (total_w//2 - title_text.get_width()//2, 100))
+            for b in buttons:
+                b.draw(screen)
+            pygame.display.flip()
         
-        for event in pygame.event.get():
+        events = wait_events()
+        redraw = needs_redraw(buttons, events)
+        for event in events:
             if event.type == pygame.QUIT:
                 return None
             
@@ -187,8 +272,6 @@ def show_color_selection(title="Select Your Color"):
                 running = False
             elif back_button.handle_event(event):
                 return "back"
-        
-        pygame.time.Clock().tick(60)
     
     return selected_color
 
@@ -206,24 +289,25 @@ def show_difficulty_menu(mode):
     buttons = [easy_button, medium_button, hard_button, random_button, back_button]
 
     running = True
+    redraw = True
+    update_hover(buttons)
     while running:
-        screen.fill(MENU_BG_COLOR)
-        font_title = pygame.font.SysFont("arial", 48, bold=True)
-        title_text = font_title.render("Select Difficulty", True, TITLE_COLOR)
-        screen.blit(title_text, (total_w//2 - title_text.get_width()//2, 100))
-        # hiển thị mode cũng căn giữa
-        font_mode = pygame.font.SysFont("arial", 24)
-        mode_text = "Human vs AI" if mode=="human_vs_ai" else "AI vs AI Demo"
-        mode_render = font_mode.render(f"Mode: {mode_text}", True, TEXT_COLOR)
-        screen.blit(mode_render, (total_w//2 - mode_render.get_width()//2, 170))
+        if redraw:
+            screen.fill(MENU_BG_COLOR)
+            title_text = render_text("Select Difficulty", 48, TITLE_COLOR, bold=True)
+            screen.blit(title_text, (total_w//2 - title_text.get_width()//2, 100))
+            # hiển thị mode cũng căn giữa
+            mode_text = "Human vs AI" if mode=="human_vs_ai" else "AI vs AI Demo"
+            mode_render = render_text(f"Mode: {mode_text}", 24, TEXT_COLOR)
+            screen.blit(mode_render, (total_w//2 - mode_render.get_width()//2, 170))
 
-        mouse_pos = pygame.mouse.get_pos()
-        for b in buttons:
-            b.update(mouse_pos)
-            b.draw(screen)
-        pygame.display.flip()
+            for b in buttons:
+                b.draw(screen)
+            pygame.display.flip()
         
-        for event in pygame.event.get():
+        events = wait_events()
+        redraw = needs_redraw(buttons, events)
+        for event in events:
             if event.type == pygame.QUIT:
                 return None
             
@@ -239,97 +323,198 @@ def show_difficulty_menu(mode):
             elif random_button.handle_event(event):
                 difficulties = ["easy", "medium", "hard"]
                 selected_difficulty = random.choice(difficulties)
-                font_notification = pygame.font.SysFont("arial", 36)
-                notification = font_notification.render(f"Selected: {selected_difficulty.capitalize()}", True, TITLE_COLOR)
+                notification = render_text(f"Selected: {selected_difficulty.capitalize()}", 36, TITLE_COLOR)
                 screen.blit(notification, ((WIDTH - LOG_WIDTH) // 2 - notification.get_width() // 2, HEIGHT - 100))
                 pygame.display.flip()
-                time.sleep(1.5)
+                if not wait_for_timer(NOTICE_EVENT, NOTICE_DELAY_MS):
+                    return None
                 running = False
             elif back_button.handle_event(event):
                 return "back"
-        
-        pygame.time.Clock().tick(60)
     
     return selected_difficulty
 
-# Draw chessboard
-def draw_board(player_color=None, ai_color=None):
-    for r in range(8):
-        for c in range(8):
-            color = LIGHT_SQUARE if (r + c) % 2 == 0 else DARK_SQUARE
-            if (player_color == "black" and player_color is not None) or (ai_color == "black" and ai_color is not None):
-                pygame.draw.rect(screen, color, pygame.Rect(c*SQUARE_SIZE, (7-r)*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-            else:
-                pygame.draw.rect(screen, color, pygame.Rect(c*SQUARE_SIZE, r*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-    
-    font = pygame.font.SysFont("arial", 12)
-    for i in range(8):
-        file_text = font.render(chr(97 + i), True, DARK_SQUARE if i % 2 == 0 else LIGHT_SQUARE)
-        screen.blit(file_text, (i * SQUARE_SIZE + SQUARE_SIZE - 12, HEIGHT - 12))
-        
-        rank_text = font.render(str(8 - i), True, DARK_SQUARE if i % 2 == 1 else LIGHT_SQUARE)
-        screen.blit(rank_text, (5, i * SQUARE_SIZE + 5))
+# True when Black is drawn at the bottom of the board
+def is_flipped(player_color=None, ai_color=None):
+    return player_color == "black" or ai_color == "black"
 
-# Draw pieces
-def draw_pieces(board, player_color=None, ai_color=None):
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece:
-            col = chess.square_file(square)
-            row = 7 - chess.square_rank(square) if not ((player_color == "black" and player_color is not None) or 
-                                                       (ai_color == "black" and ai_color is not None)) else chess.square_rank(square)
-            color = 'w' if piece.color == chess.WHITE else 'b'
-            img = images[color + piece.symbol().upper()]
-            screen.blit(img, (col*SQUARE_SIZE, row*SQUARE_SIZE))
+# Screen rect of a square for the given orientation
+def square_rect(square, flipped):
+    col = chess.square_file(square)
+    row = chess.square_rank(square) if flipped else 7 - chess.square_rank(square)
+    return pygame.Rect(col*SQUARE_SIZE, row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
 
-# Highlight selected square and valid moves
-def draw_highlights(board, selected_square, last_move, player_color=None, ai_color=None):
-    if selected_square is not None:
-        col = chess.square_file(selected_square)
-        row = 7 - chess.square_rank(selected_square) if not ((player_color == "black" and player_color is not None) or 
-                                                           (ai_color == "black" and ai_color is not None)) else chess.square_rank(selected_square)
-        pygame.draw.rect(screen, HIGHLIGHT_COLOR, (col*SQUARE_SIZE, row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE), 4)
+# Squares and coordinates pre-rendered once per orientation
+board_backgrounds = {}
+def get_board_background(flipped):
+    background = board_backgrounds.get(flipped)
+    if background is None:
+        background = pygame.Surface((WIDTH, HEIGHT))
+        for r in range(8):
+            for c in range(8):
+                color = LIGHT_SQUARE if (r + c) % 2 == 0 else DARK_SQUARE
+                row = 7 - r if flipped else r
+                pygame.draw.rect(background, color, pygame.Rect(c*SQUARE_SIZE, row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
         
+        # nhãn dùng màu của ô còn lại để luôn đọc được
+        for i in range(8):
+            bottom_is_light = (i + (0 if flipped else 1)) % 2 == 0
+            file_text = render_text(chr(97 + i), 12, DARK_SQUARE if bottom_is_light else LIGHT_SQUARE)
+            background.blit(file_text, (i * SQUARE_SIZE + SQUARE_SIZE - 12, HEIGHT - 12))
+            
+            left_is_light = (i + (1 if flipped else 0)) % 2 == 0
+            rank_text = render_text(str(i + 1 if flipped else 8 - i), 12, DARK_SQUARE if left_is_light else LIGHT_SQUARE)
+            background.blit(rank_text, (5, i * SQUARE_SIZE + 5))
+        board_backgrounds[flipped] = background
+    return background
+
+# Translucent square-sized overlays, one surface per color
+overlays = {}
+def get_overlay(color):
+    key = tuple(color)
+    overlay = overlays.get(key)
+    if overlay is None:
+        overlay = overlays[key] = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+        overlay.fill(color)
+    return overlay
+
+# Draw one square from the background up: selection and move-target marks, last-move and
+# check overlays, then the piece. state is (piece, selected, target, last_move, check) where
+# target is None, True for a capture or False for a move to an empty square.
+def draw_square(square, state, flipped):
+    piece, selected, target, in_last_move, in_check = state
+    rect = square_rect(square, flipped)
+    screen.blit(get_board_background(flipped), rect, rect)
+    
+    if selected or target:
+        pygame.draw.rect(screen, HIGHLIGHT_COLOR, rect, 4)
+    elif target is not None:
+        pygame.draw.circle(screen, HIGHLIGHT_COLOR, rect.center, SQUARE_SIZE//6)
+    if in_last_move:
+        screen.blit(get_overlay(LAST_MOVE_COLOR), rect)
+    if in_check:
+        screen.blit(get_overlay(CHECK_COLOR), rect)
+    if piece:
+        color = 'w' if piece.color == chess.WHITE else 'b'
+        screen.blit(images[color + piece.symbol().upper()], rect)
+    return rect
+
+# Legal moves indexed by from/to square plus check and game-over status of one position.
+# Built once per ply (see update) and shared by the renderer and the click handler, so
+# frames do no move generation.
+class PositionState:
+    def __init__(self, board):
+        self.ply = len(board.move_stack)
+        self.pieces = board.piece_map()
+        self.moves_from = {}
+        self.moves_to = {}
+        # (from, to) -> moves; several when a pawn promotes
+        self.moves_by_from_to = {}
         for move in board.legal_moves:
-            if move.from_square == selected_square:
-                to_square = move.to_square
-                to_col = chess.square_file(to_square)
-                to_row = 7 - chess.square_rank(to_square) if not ((player_color == "black" and player_color is not None) or 
-                                                                (ai_color == "black" and ai_color is not None)) else chess.square_rank(to_square)
-                
-                if board.piece_at(to_square):
-                    pygame.draw.rect(screen, HIGHLIGHT_COLOR, 
-                                   (to_col*SQUARE_SIZE, to_row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE), 4)
-                else:
-                    pygame.draw.circle(screen, HIGHLIGHT_COLOR,
-                                     (to_col*SQUARE_SIZE + SQUARE_SIZE//2, to_row*SQUARE_SIZE + SQUARE_SIZE//2), 
-                                     SQUARE_SIZE//6)
+            self.moves_from.setdefault(move.from_square, []).append(move)
+            self.moves_to.setdefault(move.to_square, []).append(move)
+            self.moves_by_from_to.setdefault((move.from_square, move.to_square), []).append(move)
+        self.is_check = board.is_check()
+        self.check_square = board.king(board.turn) if self.is_check else None
+        self.outcome = board.outcome()
+        self.is_game_over = self.outcome is not None
+        self.targets_cache = {}
     
-    if last_move:
-        for square in [last_move.from_square, last_move.to_square]:
-            col = chess.square_file(square)
-            row = 7 - chess.square_rank(square) if not ((player_color == "black" and player_color is not None) or 
-                                                       (ai_color == "black" and ai_color is not None)) else chess.square_rank(square)
-            s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-            s.fill(LAST_MOVE_COLOR)
-            screen.blit(s, (col*SQUARE_SIZE, row*SQUARE_SIZE))
+    # The state for board, rebuilt only when a move was pushed since it was made
+    def update(self, board):
+        return self if len(board.move_stack) == self.ply else PositionState(board)
     
-    if board.is_check():
-        king_square = board.king(board.turn)
-        col = chess.square_file(king_square)
-        row = 7 - chess.square_rank(king_square) if not ((player_color == "black" and player_color is not None) or 
-                                                        (ai_color == "black" and ai_color is not None)) else chess.square_rank(king_square)
-        s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-        s.fill(CHECK_COLOR)
-        screen.blit(s, (col*SQUARE_SIZE, row*SQUARE_SIZE))
+    # Legal move from from_square to to_square, the given promotion piece if several match
+    def find_move(self, from_square, to_square, promotion=None):
+        moves = self.moves_by_from_to.get((from_square, to_square))
+        if not moves:
+            return None
+        for move in moves:
+            if move.promotion == promotion:
+                return move
+        return moves[0]
+    
+    # Target squares of the moves from a square: True if the target holds a piece, else False
+    def targets(self, from_square):
+        targets = self.targets_cache.get(from_square)
+        if targets is None:
+            targets = self.targets_cache[from_square] = {
+                move.to_square: move.to_square in self.pieces for move in self.moves_from.get(from_square, ())
+            }
+        return targets
+    
+    def result_message(self):
+        termination = self.outcome.termination if self.outcome else None
+        if termination == chess.Termination.CHECKMATE:
+            winner = "White" if self.outcome.winner == chess.WHITE else "Black"
+            return f"Checkmate! {winner} wins!"
+        elif termination == chess.Termination.STALEMATE:
+            return "Stalemate! It's a draw!"
+        elif termination == chess.Termination.INSUFFICIENT_MATERIAL:
+            return "Draw due to insufficient material!"
+        elif termination in (chess.Termination.SEVENTYFIVE_MOVES, chess.Termination.FIVEFOLD_REPETITION):
+            return "Draw (50-move rule or repetition)"
+        return "Game over!"
 
-# Draw info panel
-def draw_info_panel(board, difficulty, mode, player_color=None):
-    pygame.draw.rect(screen, INFO_BG_COLOR, (0, HEIGHT, WIDTH + LOG_WIDTH, INFO_HEIGHT))
+# Draws the game screen, repainting only the squares, info panel and move log that changed
+# since the previous frame and pushing just those rects to the display
+class GameRenderer:
+    def __init__(self, mode, difficulty, player_color=None, ai_color=None):
+        self.mode = mode
+        self.difficulty = difficulty
+        self.player_color = player_color
+        self.flipped = is_flipped(player_color, ai_color)
+        self.invalidate()
+    
+    # Repaint everything on the next draw, e.g. after a menu was drawn over the game
+    def invalidate(self):
+        self.square_states = [None] * 64
+        self.info_state = None
+        self.log_version = None
+        self.full_redraw = True
     
-    font = pygame.font.SysFont("arial", 20)
+    def draw(self, board, position, selected_square, last_move, move_log, update=True):
+        targets = position.targets(selected_square) if selected_square is not None else {}
+        last_move_squares = (last_move.from_square, last_move.to_square) if last_move else ()
+        pieces = position.pieces
+        check_square = position.check_square
+        
+        dirty = []
+        for square in chess.SQUARES:
+            state = (pieces.get(square), square == selected_square, targets.get(square),
+                     square in last_move_squares, square == check_square)
+            if state != self.square_states[square]:
+                self.square_states[square] = state
+                dirty.append(draw_square(square, state, self.flipped))
+        
+        viewing = (move_log.viewing, move_log.moves[move_log.viewing]) if move_log.viewing is not None else None
+        info_state = (board.turn, position.is_check, viewing)
+        if info_state != self.info_state:
+            self.info_state = info_state
+            draw_info_panel(board, self.difficulty, self.mode, self.player_color, viewing)
+            dirty.append(pygame.Rect(0, HEIGHT, WIDTH + LOG_WIDTH, INFO_HEIGHT))
+        
+        if move_log.version != self.log_version:
+            self.log_version = move_log.version
+            move_log.draw()
+            dirty.append(move_log.rect)
+        
+        if update:
+            if self.full_redraw:
+                pygame.display.flip()
+            elif dirty:
+                pygame.display.update(dirty)
+        self.full_redraw = False
+        return dirty
+
+# Draw info panel; viewing is (index, san) of the past move being viewed from the move log
+def draw_info_panel(board, difficulty, mode, player_color=None, viewing=None):
+    pygame.draw.rect(screen, INFO_BG_COLOR, (0, HEIGHT, WIDTH + LOG_WIDTH, INFO_HEIGHT))
     
-    if mode == "human_vs_ai":
+    if viewing is not None:
+        index, move_san = viewing
+        turn_text = f"Viewing {index // 2 + 1}.{'' if index % 2 == 0 else '..'} {move_san} - click the board to return"
+    elif mode == "human_vs_ai":
         if player_color == "white":
             turn_text = "White (Human) to move" if board.turn == chess.WHITE else "Black (AI) thinking..."
         else:
@@ -340,38 +525,103 @@ def draw_info_panel(board, difficulty, mode, player_color=None):
     if board.is_check():
         turn_text += " - CHECK!"
     
-    status_text = font.render(turn_text, True, TEXT_COLOR)
+    status_text = render_text(turn_text, 20, TEXT_COLOR)
     screen.blit(status_text, (20, HEIGHT + 20))
     
-    diff_text = font.render(f"Difficulty: {difficulty.capitalize()}", True, TEXT_COLOR)
+    diff_text = render_text(f"Difficulty: {difficulty.capitalize()}", 20, TEXT_COLOR)
     screen.blit(diff_text, (WIDTH + LOG_WIDTH - diff_text.get_width() - 20, HEIGHT + 20))
     
     return None, None
 
-# Draw move log
-def draw_move_log(move_history):
-    log_rect = pygame.Rect(WIDTH, 0, LOG_WIDTH, HEIGHT)
-    pygame.draw.rect(screen, LOG_BG_COLOR, log_rect)
-
-    font = pygame.font.SysFont("arial", 16)
-    line_height = font.get_height() + 4
-    max_lines = HEIGHT // line_height
-
-    # chỉ lấy N dòng cuối cùng
-    history = move_history[-max_lines:]
-    start_index = len(move_history) - len(history)
-
-    y_offset = 10
-    for i, move in enumerate(history):
-        abs_i = start_index + i
-        move_num = (abs_i // 2) + 1
+# Move log kept as one tall surface that only grows: adding a move renders just its line and
+# drawing blits the visible window of it, so a frame costs the same at move 5 and move 300.
+# The log scrolls with the mouse wheel, and clicking a move views the position after it.
+class MoveLog:
+    SCROLL_LINES = 3
+    
+    def __init__(self):
+        self.moves = []
+        self.rect = pygame.Rect(WIDTH, 0, LOG_WIDTH, HEIGHT)
+        self.line_height = get_font(16).get_height() + 4
+        self.visible_lines = (HEIGHT - 20) // self.line_height
+        self.surface = pygame.Surface((LOG_WIDTH, self.line_height * 64))
+        self.surface.fill(LOG_BG_COLOR)
+        # first visible line, and the index of the move being viewed (None for the live position)
+        self.first_line = 0
+        self.viewing = None
+        # bumped on every change so the renderer knows when to redraw the log
+        self.version = 0
+    
+    def __len__(self):
+        return len(self.moves)
+    
+    def append(self, move_san):
+        index = len(self.moves)
+        at_bottom = self.first_line >= self.max_first_line()
+        self.moves.append(move_san)
+        
+        if (index + 1) * self.line_height > self.surface.get_height():
+            surface = pygame.Surface((LOG_WIDTH, self.surface.get_height() * 2))
+            surface.fill(LOG_BG_COLOR)
+            surface.blit(self.surface, (0, 0))
+            self.surface = surface
         # chẵn: in số, lẻ: in nước thứ hai
-        text = f"{move_num}. {move}" if abs_i % 2 == 0 else move
-        surf = font.render(text, True, TEXT_COLOR)
-        screen.blit(surf, (WIDTH + 10, y_offset))
-        y_offset += line_height
+        text = f"{index // 2 + 1}. {move_san}" if index % 2 == 0 else move_san
+        # log lines are rendered once, so they bypass the shared text cache
+        self.surface.blit(get_font(16).render(text, True, TEXT_COLOR), (10, index * self.line_height))
+        
+        if at_bottom and self.viewing is None:
+            self.first_line = self.max_first_line()
+        self.version += 1
+    
+    def max_first_line(self):
+        return max(0, len(self.moves) - self.visible_lines)
+    
+    def scroll(self, lines):
+        first_line = min(max(self.first_line + lines, 0), self.max_first_line())
+        if first_line != self.first_line:
+            self.first_line = first_line
+            self.version += 1
+    
+    # Index of the move on the log line at pos, or None
+    def move_at(self, pos):
+        if not self.rect.collidepoint(pos) or pos[1] < 10:
+            return None
+        index = self.first_line + (pos[1] - 10) // self.line_height
+        return index if index < len(self.moves) and index < self.first_line + self.visible_lines else None
+    
+    # View the position after move index; None or the latest move returns to the live position
+    def view(self, index):
+        if index is not None and index >= len(self.moves) - 1:
+            index = None
+        if index != self.viewing:
+            self.viewing = index
+            self.version += 1
+    
+    def draw(self):
+        pygame.draw.rect(screen, LOG_BG_COLOR, self.rect)
+        area = pygame.Rect(0, self.first_line * self.line_height, LOG_WIDTH, self.visible_lines * self.line_height)
+        screen.blit(self.surface, (WIDTH, 10), area)
+        
+        if self.viewing is not None and self.first_line <= self.viewing < self.first_line + self.visible_lines:
+            y = 10 + (self.viewing - self.first_line) * self.line_height
+            pygame.draw.rect(screen, HIGHLIGHT_COLOR, (WIDTH + 4, y - 2, LOG_WIDTH - 8, self.line_height), 1)
+        
+        # thanh cuộn khi log dài hơn khung
+        if len(self.moves) > self.visible_lines:
+            track = HEIGHT - 20
+            bar_height = max(20, track * self.visible_lines // len(self.moves))
+            bar_y = 10 + (track - bar_height) * self.first_line // self.max_first_line()
+            pygame.draw.rect(screen, BUTTON_COLOR, (WIDTH + LOG_WIDTH - 8, bar_y, 4, bar_height))
+        
+        pygame.draw.rect(screen, TITLE_COLOR, self.rect, 2)
 
-    pygame.draw.rect(screen, TITLE_COLOR, log_rect, 2)
+# Board at the position after move index of board's game
+def board_after_move(board, index):
+    view_board = board.root()
+    for move in board.move_stack[:index + 1]:
+        view_board.push(move)
+    return view_board
 
 # Promotion selection screen
 def show_promotion_menu(piece_color):
@@ -383,8 +633,7 @@ def show_promotion_menu(piece_color):
     pygame.draw.rect(screen, MENU_BG_COLOR, promo_box)
     pygame.draw.rect(screen, TITLE_COLOR, promo_box, 4)
     
-    font_title = pygame.font.SysFont("arial", 36, bold=True)
-    title_text = font_title.render("Select Promotion", True, TITLE_COLOR)
+    title_text = render_text("Select Promotion", 36, TITLE_COLOR, bold=True)
     screen.blit(title_text, ((WIDTH - LOG_WIDTH)//2 - title_text.get_width()//2, HEIGHT//4 + 20))
     
     button_width, button_height = 80, 80
@@ -417,29 +666,32 @@ def show_promotion_menu(piece_color):
     
     running = True
     selected_piece = None
+    redraw = True
+    update_hover(buttons)
     
     while running:
-        mouse_pos = pygame.mouse.get_pos()
-        for button in buttons:
-            button.update(mouse_pos)
-            button.draw(screen)
-            
-            if button == queen_button:
-                img = images[f"{piece_color}Q"]
-            elif button == rook_button:
-                img = images[f"{piece_color}R"]
-            elif button == bishop_button:
-                img = images[f"{piece_color}B"]
-            elif button == knight_button:
-                img = images[f"{piece_color}N"]
+        if redraw:
+            for button in buttons:
+                button.draw(screen)
+                
+                if button == queen_button:
+                    img = images[f"{piece_color}Q"]
+                elif button == rook_button:
+                    img = images[f"{piece_color}R"]
+                elif button == bishop_button:
+                    img = images[f"{piece_color}B"]
+                elif button == knight_button:
+                    img = images[f"{piece_color}N"]
+                
+                img_scaled = pygame.transform.scale(img, (button_width - 20, button_height - 20))
+                img_rect = img_scaled.get_rect(center=(button.rect.centerx, button.rect.centery - 10))
+                screen.blit(img_scaled, img_rect)
             
-            img_scaled = pygame.transform.scale(img, (button_width - 20, button_height - 20))
-            img_rect = img_scaled.get_rect(center=(button.rect.centerx, button.rect.centery - 10))
-            screen.blit(img_scaled, img_rect)
-        
-        pygame.display.flip()
+            pygame.display.flip()
         
-        for event in pygame.event.get():
+        events = wait_events()
+        redraw = needs_redraw(buttons, events)
+        for event in events:
             if event.type == pygame.QUIT:
                 return None
             
@@ -455,38 +707,31 @@ def show_promotion_menu(piece_color):
             elif knight_button.handle_event(event):
                 selected_piece = chess.KNIGHT
                 running = False
-        
-        pygame.time.Clock().tick(60)
     
     return selected_piece
 
 # Game result screen
-def show_game_result(board, last_move, result, mode, difficulty, move_history, player_color=None, ai_color=None):
-    draw_board(player_color, ai_color)
-    draw_highlights(board, None, last_move, player_color, ai_color)
-    draw_pieces(board, player_color, ai_color)
-    draw_info_panel(board, difficulty, mode, player_color)
-    draw_move_log(move_history)
+def show_game_result(board, last_move, result, mode, difficulty, move_log, player_color=None, ai_color=None):
+    move_log.view(None)
+    GameRenderer(mode, difficulty, player_color, ai_color).draw(board, PositionState(board), None, last_move, move_log,
+                                                               update=False)
     
     result_box_height = 200
     result_box = pygame.Rect(0, HEIGHT, WIDTH + LOG_WIDTH, result_box_height)
     pygame.draw.rect(screen, MENU_BG_COLOR, result_box)
     pygame.draw.rect(screen, TITLE_COLOR, result_box, 4)
     
-    font_title = pygame.font.SysFont("arial", 36, bold=True)
-    font_info = pygame.font.SysFont("arial", 24)
-    
-    title_text = font_title.render("Game Over", True, TITLE_COLOR)
+    title_text = render_text("Game Over", 36, TITLE_COLOR, bold=True)
     screen.blit(title_text, ((WIDTH + LOG_WIDTH)//2 - title_text.get_width()//2, HEIGHT + 20))
     
-    result_text = font_info.render(result, True, TEXT_COLOR)
+    result_text = render_text(result, 24, TEXT_COLOR)
     screen.blit(result_text, ((WIDTH + LOG_WIDTH)//2 - result_text.get_width()//2, HEIGHT + 70))
     
     mode_text = "Human vs AI" if mode == "human_vs_ai" else "AI vs AI Demo"
-    mode_render = font_info.render(f"Mode: {mode_text}", True, TEXT_COLOR)
+    mode_render = render_text(f"Mode: {mode_text}", 24, TEXT_COLOR)
     screen.blit(mode_render, ((WIDTH + LOG_WIDTH)//2 - mode_render.get_width()//2, HEIGHT + 110))
     
-    diff_render = font_info.render(f"Difficulty: {difficulty.capitalize()}", True, TEXT_COLOR)
+    diff_render = render_text(f"Difficulty: {difficulty.capitalize()}", 24, TEXT_COLOR)
     screen.blit(diff_render, ((WIDTH + LOG_WIDTH)//2 - diff_render.get_width()//2, HEIGHT + 150))
     
     button_width, button_height = 200, 50
@@ -510,16 +755,18 @@ def show_game_result(board, last_move, result, mode, difficulty, move_history, p
     
     running = True
     action = None
+    redraw = True
+    update_hover(buttons)
     
     while running:
-        mouse_pos = pygame.mouse.get_pos()
-        for button in buttons:
-            button.update(mouse_pos)
-            button.draw(screen)
-        
-        pygame.display.flip()
+        if redraw:
+            for button in buttons:
+                button.draw(screen)
+            pygame.display.flip()
         
-        for event in pygame.event.get():
+        events = wait_events()
+        redraw = needs_redraw(buttons, events)
+        for event in events:
             if event.type == pygame.QUIT:
                 return "quit"
             
@@ -529,412 +776,107 @@ def show_game_result(board, last_move, result, mode, difficulty, move_history, p
             elif main_menu_button.handle_event(event):
                 action = "main_menu"
                 running = False
-        
-        pygame.time.Clock().tick(60)
     
     return action
 
-# Corrected piece-square tables (64 elements each)
-piece_square_tables = {
-    chess.PAWN: [
-        0,  0,  0,  0,  0,  0,  0,  0,
-        50, 50, 50, 50, 50, 50, 50, 50,
-        10, 10, 20, 30, 30, 20, 10, 10,
-        5,  5, 10, 25, 25, 10,  5,  5,
-        0,  0,  0, 20, 20,  0,  0,  0,
-        5, -5,-10,  0,  0,-10, -5,  5,
-        5, 10, 10,-20,-20, 10, 10,  5,
-        0,  0,  0,  0,  0,  0,  0,  0
-    ],
-    chess.KNIGHT: [
-        -50,-40,-30,-30,-30,-30,-40,-50,
-        -40,-20,  0,  0,  0,  0,-20,-40,
-        -30,  0, 10, 15, 15, 10,  0,-30,
-        -30,  5, 15, 20, 20, 15,  5,-30,
-        -30,  0, 15, 20, 20, 15,  0,-30,
-        -30,  5, 10, 15, 15, 10,  5,-30,
-        -40,-20,  0,  5,  5,  0,-20,-40,
-        -50,-40,-30,-30,-30,-30,-40,-50
-    ],
-    chess.BISHOP: [
-        -20,-10,-10,-10,-10,-10,-10,-20,
-        -10,  0,  0,  0,  0,  0,  0,-10,
-        -10,  0, 10, 10, 10, 10,  0,-10,
-        -10,  5,  5, 10, 10,  5,  5,-10,
-        -10,  0,  5, 10, 10,  5,  0,-10,
-        -10,  5,  5,  5,  5,  5,  5,-10,
-        -10,  0,  5,  0,  0,  0,  0,-10,
-        -20,-10,-10,-10,-10,-10,-10,-20
-    ],
-    chess.ROOK: [
-        0,  0,  0,  0,  0,  0,  0,  0,
-        5, 10, 10, 10, 10, 10, 10,  5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        -5,  0,  0,  0,  0,  0,  0, -5,
-        0,  0,  0,  5,  5,  0,  0,  0
-    ],
-    chess.QUEEN: [
-        -20,-10,-10, -5, -5,-10,-10,-20,
-        -10,  0,  0,  0,  0,  0,  0,-10,
-        -10,  0,  5,  5,  5,  5,  0,-10,
-        -5,  0,  5,  5,  5,  5,  0, -5,
-        0,  0,  5,  5,  5,  5,  0, -5,
-        -10,  5,  5,  5,  5,  5,  0,-10,
-        -10,  0,  5,  0,  0,  0,  0,-10,
-        -20,-10,-10, -5, -5,-10,-10,-20
-    ],
-    chess.KING: [
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -30,-40,-40,-50,-50,-40,-40,-30,
-        -20,-30,-30,-40,-40,-30,-30,-20,
-        -10,-20,-20,-20,-20,-20,-20,-10,
-        20, 20,  0,  0,  0,  0, 20, 20,
-        20, 30, 10,  0,  0, 10, 30, 20
-    ]
-}
-
-# End game king piece square table (64 elements)
-king_endgame_table = [
-    -50,-40,-30,-20,-20,-30,-40,-50,
-    -30,-20,-10,  0,  0,-10,-20,-30,
-    -30,-10, 20, 30, 30, 20,-10,-30,
-    -30,-10, 30, 40, 40, 30,-10,-30,
-    -30,-10, 30, 40, 40, 30,-10,-30,
-    -30,-10, 20, 30, 30, 20,-10,-30,
-    -30,-30,  0,  0,  0,  0,-30,-30,
-    -50,-30,-30,-30,-30,-30,-30,-50
-]
-
-# Piece values
-piece_values = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, 
-                chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
-
-# Global transposition table
-transposition_table = {}
-
-# Evaluate move for sorting
-def evaluate_move(board, move):
-    score = 0
-    try:
-        if board.is_capture(move):
-            victim_piece = board.piece_at(move.to_square)
-            attacker_piece = board.piece_at(move.from_square)
-            if victim_piece and attacker_piece:
-                score += 10 * piece_values.get(victim_piece.piece_type, 0) - piece_values.get(attacker_piece.piece_type, 0) / 10
-        
-        if move.promotion:
-            score += 900
-        
-        board.push(move)
-        if board.is_check():
-            score += 50
-        board.pop()
-        
-        piece = board.piece_at(move.from_square)
-        if piece and (piece.piece_type == chess.PAWN or piece.piece_type == chess.KNIGHT):
-            to_file = chess.square_file(move.to_square)
-            to_rank = chess.square_rank(move.to_square)
-            center_distance = abs(3.5 - to_file) + abs(3.5 - to_rank)
-            score += (4 - center_distance) * 5
-    
-    except Exception as e:
-        print(f"Error in evaluate_move: {str(e)}")
-    
-    return score
-
-# Improved board evaluation
-def evaluate_board(board, difficulty):
-    try:
-        if board.is_checkmate():
-            return -10000 if board.turn == chess.WHITE else 10000
-        
-        if board.is_stalemate() or board.is_insufficient_material():
-            return 0
-        
-        score = 0
-        
-        for piece_type in piece_values:
-            white_pieces = len(board.pieces(piece_type, chess.WHITE))
-            black_pieces = len(board.pieces(piece_type, chess.BLACK))
-            score += piece_values[piece_type] * (white_pieces - black_pieces)
-        
-        if difficulty != "easy":
-            for piece_type in piece_square_tables:
-                if piece_type == chess.KING and len(list(board.piece_map().keys())) <= 12:
-                    for square in board.pieces(piece_type, chess.WHITE):
-                        score += king_endgame_table[square] / 10
-                    for square in board.pieces(piece_type, chess.BLACK):
-                        score -= king_endgame_table[63 - square] / 10
-                else:
-                    for square in board.pieces(piece_type, chess.WHITE):
-                        score += piece_square_tables[piece_type][square] / 10
-                    for square in board.pieces(piece_type, chess.BLACK):
-                        score -= piece_square_tables[piece_type][63 - square] / 10
-        
-        if difficulty == "hard":
-            current_turn = board.turn
-            board.turn = chess.WHITE
-            white_mobility = len(list(board.legal_moves))
-            board.turn = chess.BLACK
-            black_mobility = len(list(board.legal_moves))
-            board.turn = current_turn
-            score += (white_mobility - black_mobility) * 0.1
-            
-            white_king_square = board.king(chess.WHITE)
-            black_king_square = board.king(chess.BLACK)
-            
-            if white_king_square in [chess.G1, chess.C1]:
-                score += 30
-            if black_king_square in [chess.G8, chess.C8]:
-                score -= 30
-            
-            center_squares = [chess.D4, chess.E4, chess.D5, chess.E5]
-            for square in center_squares:
-                piece = board.piece_at(square)
-                if piece:
-                    score += 10 if piece.color == chess.WHITE else -10
-                
-                for pawn_square in board.pieces(chess.PAWN, chess.WHITE):
-                    pawn_file = chess.square_file(pawn_square)
-                    pawn_rank = chess.square_rank(pawn_square)
-                    if 2 <= pawn_file <= 5 and 3 <= pawn_rank <= 4:
-                        score += 5
-                
-                for pawn_square in board.pieces(chess.PAWN, chess.BLACK):
-                    pawn_file = chess.square_file(pawn_square)
-                    pawn_rank = chess.square_rank(pawn_square)
-                    if 2 <= pawn_file <= 5 and 3 <= pawn_rank <= 4:
-                        score -= 5
-            
-            if len(list(board.piece_map().keys())) > 28:
-                developed_white = 0
-                developed_black = 0
-                for square, piece in [(chess.B1, chess.KNIGHT), (chess.G1, chess.KNIGHT), 
-                                    (chess.C1, chess.BISHOP), (chess.F1, chess.BISHOP)]:
-                    if not board.piece_at(square) or board.piece_at(square).piece_type != piece:
-                        developed_white += 1
-                for square, piece in [(chess.B8, chess.KNIGHT), (chess.G8, chess.KNIGHT), 
-                                    (chess.C8, chess.BISHOP), (chess.F8, chess.BISHOP)]:
-                    if not board.piece_at(square) or board.piece_at(square).piece_type != piece:
-                        developed_black += 1
-                score += developed_white * 10
-                score -= developed_black * 10
-        
-        return score
-    
-    except Exception as e:
-        print(f"Error in evaluate_board: {str(e)} with board state: {board.fen()}")
-        return 0
-
-# Alpha-Beta with memory
-def alpha_beta_with_memory(board, depth, alpha, beta, is_max, difficulty):
-    board_hash = board.fen()
-    
-    try:
-        if board_hash in transposition_table and transposition_table[board_hash]["depth"] >= depth:
-            return transposition_table[board_hash]["score"]
-        
-        if depth == 0 or board.is_game_over():
-            score = evaluate_board(board, difficulty)
-            transposition_table[board_hash] = {"score": score, "depth": depth}
-            return score
-        
-        if is_max:
-            max_eval = float('-inf')
-            moves = list(board.legal_moves)
-            if not moves:
-                print("Error: No legal moves in alpha_beta_with_memory (max)")
-                return evaluate_board(board, difficulty)
-            
-            move_scores = [(move, evaluate_move(board, move)) for move in moves]
-            sorted_moves = [move for move, score in sorted(move_scores, key=lambda x: -x[1])]
-            
-            for move in sorted_moves:
-                board.push(move)
-                eval = alpha_beta_with_memory(board, depth - 1, alpha, beta, False, difficulty)
-                board.pop()
-                max_eval = max(max_eval, eval)
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-            
-            transposition_table[board_hash] = {"score": max_eval, "depth": depth}
-            return max_eval
-        else:
-            min_eval = float('inf')
-            moves = list(board.legal_moves)
-            if not moves:
-                print("Error: No legal moves in alpha_beta_with_memory (min)")
-                return evaluate_board(board, difficulty)
-            
-            move_scores = [(move, evaluate_move(board, move)) for move in moves]
-            sorted_moves = [move for move, score in sorted(move_scores, key=lambda x: -x[1])]
-            
-            for move in sorted_moves:
-                board.push(move)
-                eval = alpha_beta_with_memory(board, depth - 1, alpha, beta, True, difficulty)
-                board.pop()
-                min_eval = min(min_eval, eval)
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-            
-            transposition_table[board_hash] = {"score": min_eval, "depth": depth}
-            return min_eval
-    
-    except Exception as e:
-        print(f"Error in alpha_beta_with_memory (depth: {depth}, is_max: {is_max}): {str(e)} with board state: {board.fen()}")
-        return evaluate_board(board, difficulty)
-
-# AI move with error handling
-def make_ai_move(board, difficulty):
-    if board.is_game_over():
-        return None
-    
-    legal_moves = list(board.legal_moves)
-    if not legal_moves:
-        print("Error: No legal moves available!")
-        return None
-    
-    try:
-        if difficulty == "easy":
-            captures = [move for move in legal_moves if board.is_capture(move)]
-            if captures and random.random() < 0.7:
-                move = random.choice(captures)
-            else:
-                move = random.choice(legal_moves)
-            return move
-        
-        elif difficulty == "hard":
-            best_move = None
-            best_score = float('-inf') if board.turn == chess.WHITE else float('inf')
-            alpha = float('-inf')
-            beta = float('inf')
-            
-            if len(transposition_table) > 100000:
-                transposition_table.clear()
-            
-            moves = legal_moves
-            move_scores = [(move, evaluate_move(board, move)) for move in moves]
-            sorted_moves = [move for move, score in sorted(move_scores, key=lambda x: -x[1])]
-            
-            for depth in range(1, 4):
-                if board.turn == chess.WHITE:
-                    best_score = float('-inf')
-                    for move in sorted_moves:
-                        board.push(move)
-                        score = alpha_beta_with_memory(board, depth, alpha, beta, False, difficulty)
-                        board.pop()
-                        if score > best_score:
-                            best_score = score
-                            best_move = move
-                        alpha = max(alpha, score)
-                else:
-                    best_score = float('inf')
-                    for move in sorted_moves:
-                        board.push(move)
-                        score = alpha_beta_with_memory(board, depth, alpha, beta, True, difficulty)
-                        board.pop()
-                        if score < best_score:
-                            best_score = score
-                            best_move = move
-                        beta = min(beta, score)
-            return best_move
-        
-        else:  # medium
-            best_move = None
-            best_score = float('-inf') if board.turn == chess.WHITE else float('inf')
-            
-            moves = legal_moves
-            move_scores = [(move, evaluate_move(board, move)) for move in moves]
-            sorted_moves = [move for move, score in sorted(move_scores, key=lambda x: -x[1])]
-            
-            for move in sorted_moves:
-                board.push(move)
-                if board.turn == chess.WHITE:
-                    score = alpha_beta_with_memory(board, 1, float('-inf'), float('inf'), False, difficulty)
-                    if score > best_score:
-                        best_score = score
-                        best_move = move
-                else:
-                    score = alpha_beta_with_memory(board, 1, float('-inf'), float('inf'), True, difficulty)
-                    if score < best_score:
-                        best_score = score
-                        best_move = move
-                board.pop()
-            return best_move
-    
-    except Exception as e:
-        print(f"Error in make_ai_move (difficulty: {difficulty}): {str(e)} with board state: {board.fen()}")
-        return None
+# Cancel the AI and game-over timers of a game that is being left
+def stop_game_timers():
+    pygame.time.set_timer(AI_START_EVENT, 0)
+    pygame.time.set_timer(GAME_OVER_EVENT, 0)
 
 # Main game function with move log and debug
 def play_game(mode, difficulty, player_color=None, ai_color=None):
     board = chess.Board()
     selected_square = None
     last_move = None
-    move_history = []
+    move_log = MoveLog()
     promotion_pending = False
     pending_move = None
     
-    if mode == "human_vs_ai" and player_color == "black" and board.turn == chess.WHITE:
-        ai_move = make_ai_move(board, difficulty)
-        if ai_move:
-            move_san = board.san(ai_move)
-            board.push(ai_move)
-            move_history.append(move_san)
-            last_move = ai_move
-            if MOVE_SOUND:
-                MOVE_SOUND.play()
-        else:
-            print("AI failed to make initial move!")
-    
-    clock = pygame.time.Clock()
     running = True
     ai_thinking = False
-    ai_move_time = 0
+    ai_start_due = False
+    ai_difficulty = None
+    game_over_pending = False
+    game_over_due = False
+    # the worker thread wakes the loop by posting AI_DONE_EVENT
+    ai_worker = AIWorker(LOG_SEARCH_STATS, on_done=lambda: pygame.event.post(pygame.event.Event(AI_DONE_EVENT)))
+    renderer = GameRenderer(mode, difficulty, player_color, ai_color)
+    position = PositionState(board)
+    # board and PositionState of the past position picked in the move log
+    view_board = None
+    view_position = None
+    # the first pass must reach the AI scheduling below before the loop sleeps on events
+    skip_wait = True
     
     while running:
-        draw_board(player_color, ai_color)
-        draw_highlights(board, selected_square, last_move, player_color, ai_color)
-        draw_pieces(board, player_color, ai_color)
-        draw_info_panel(board, difficulty, mode, player_color)
-        draw_move_log(move_history)
+        position = position.update(board)
+        if move_log.viewing is None:
+            renderer.draw(board, position, selected_square, last_move, move_log)
+        else:
+            if view_position is None or view_position.ply != move_log.viewing + 1:
+                view_board = board_after_move(board, move_log.viewing)
+                view_position = PositionState(view_board)
+            renderer.draw(view_board, view_position, None, view_board.peek(), move_log)
         
         if promotion_pending:
             piece_color = 'w' if board.turn == chess.WHITE else 'b'
             promotion_choice = show_promotion_menu(piece_color)
+            renderer.invalidate()
             if promotion_choice is None:
+                stop_game_timers()
+                ai_worker.shutdown()
                 return "quit"
             
             final_move = chess.Move(pending_move.from_square, pending_move.to_square, promotion=promotion_choice)
             move_san = board.san(final_move)
             board.push(final_move)
-            move_history.append(move_san)
+            move_log.append(move_san)
             last_move = final_move
             if MOVE_SOUND:
                 MOVE_SOUND.play()
             
             promotion_pending = False
             pending_move = None
+            selected_square = None
             if board.is_check() and CHECK_SOUND:
                 CHECK_SOUND.play()
-            pygame.display.flip()
-            continue
+            # the board changed, so let the AI be scheduled below before sleeping again
+            events = []
+        elif skip_wait:
+            events = []
+        else:
+            events = wait_events()
+        skip_wait = False
         
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 print("Quit event detected, exiting game.")
+                stop_game_timers()
+                ai_worker.shutdown()
                 return "quit"
+            elif event.type == AI_START_EVENT:
+                ai_start_due = True
+            elif event.type == GAME_OVER_EVENT:
+                game_over_due = True
+            elif event.type == pygame.MOUSEWHEEL and move_log.rect.collidepoint(pygame.mouse.get_pos()):
+                move_log.scroll(-event.y * MoveLog.SCROLL_LINES)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                # bấm vào một nước trong log để xem lại thế cờ, bấm vào bàn cờ để quay lại
+                x, y = pygame.mouse.get_pos()
+                if move_log.rect.collidepoint((x, y)):
+                    move_index = move_log.move_at((x, y))
+                    if move_index is not None:
+                        move_log.view(move_index)
+                    continue
+                if move_log.viewing is not None:
+                    move_log.view(None)
+                    continue
             
-            if mode == "human_vs_ai" and ((player_color == "white" and board.turn == chess.WHITE) or 
+            if mode == "human_vs_ai" and not game_over_pending and ((player_color == "white" and board.turn == chess.WHITE) or 
                               (player_color == "black" and board.turn == chess.BLACK)):
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                    position = position.update(board)
                     x, y = pygame.mouse.get_pos()
                     print(f"Mouse click at ({x}, {y})")
                     
@@ -952,11 +894,7 @@ def play_game(mode, difficulty, player_color=None, ai_color=None):
                         else:
                             to_square = square
                             # Find the matching legal move
-                            legal_move = None
-                            for m in board.legal_moves:
-                                if m.from_square == selected_square and m.to_square == to_square:
-                                    legal_move = m
-                                    break
+                            legal_move = position.find_move(selected_square, to_square)
                             
                             piece = board.piece_at(selected_square)
                             
@@ -981,7 +919,7 @@ def play_game(mode, difficulty, player_color=None, ai_color=None):
                                         move_san = board.san(legal_move)
                                         board.push(legal_move)
                                         print(f"Move pushed: {chess.Move.uci(legal_move)}")
-                                        move_history.append(move_san)
+                                        move_log.append(move_san)
                                         print(f"Move history updated: {move_san}")
                                         last_move = legal_move
                                         selected_square = None
@@ -1015,7 +953,45 @@ def play_game(mode, difficulty, player_color=None, ai_color=None):
                         selected_square = None
                         print("Click outside board, resetting selection")
         
-        if not board.is_game_over():
+        # ai_start_due stays set while the search runs, so a finished ponder search still waits
+        # for the move delay before its move is played
+        if ai_thinking and ai_start_due and ai_worker.is_idle():
+            ai_worker.start(board, ai_difficulty)
+        
+        elif ai_start_due and ai_worker.is_done():
+            ai_start_due = False
+            ai_move = ai_worker.result()
+            if ai_move:
+                if board.is_capture(ai_move):
+                    if CAPTURE_SOUND:
+                        CAPTURE_SOUND.play()
+                elif board.is_castling(ai_move):
+                    if CASTLE_SOUND:
+                        CASTLE_SOUND.play()
+                else:
+                    if MOVE_SOUND:
+                        MOVE_SOUND.play()
+                move_san = board.san(ai_move)
+                board.push(ai_move)
+                move_log.append(move_san)
+                last_move = ai_move
+                print(f"AI move made: {move_san}")
+                if board.is_check():
+                    if CHECK_SOUND:
+                        CHECK_SOUND.play()
+            else:
+                print(f"Warning: AI failed to produce a move with board state: {board.fen()}")
+            ai_thinking = False
+            
+            # đoán nước đáp của người chơi và tính trước trong lúc họ suy nghĩ
+            ponder_move = ai_worker.ponder_move(board) if PONDERING and mode == "human_vs_ai" else None
+            if ponder_move is not None and not board.is_game_over():
+                ai_worker.ponder(board, ponder_move, ai_difficulty)
+                print(f"Pondering on {board.san(ponder_move)}")
+        
+        # Schedule the next AI move right away, so the loop can sleep until AI_START_EVENT
+        position = position.update(board)
+        if not position.is_game_over and not ai_thinking:
             if mode == "ai_vs_ai":
                 current_difficulty = difficulty if (ai_color == "white" and board.turn == chess.WHITE) or \
                                                (ai_color == "black" and board.turn == chess.BLACK) else "easy"
@@ -1024,62 +1000,46 @@ def play_game(mode, difficulty, player_color=None, ai_color=None):
                                                     (player_color == "black" and board.turn == chess.WHITE)) else None
             
             if current_difficulty:
-                if not ai_thinking:
-                    ai_thinking = True
-                    ai_move_time = time.time() + 0.5
-                    print(f"AI thinking started for {current_difficulty} at turn {board.turn}")
-                
-                elif time.time() > ai_move_time:
-                    ai_move = make_ai_move(board, current_difficulty)
-                    if ai_move:
-                        if board.is_capture(ai_move):
-                            if CAPTURE_SOUND:
-                                CAPTURE_SOUND.play()
-                        elif board.is_castling(ai_move):
-                            if CASTLE_SOUND:
-                                CASTLE_SOUND.play()
-                        else:
-                            if MOVE_SOUND:
-                                MOVE_SOUND.play()
-                        move_san = board.san(ai_move)
-                        board.push(ai_move)
-                        move_history.append(move_san)
-                        last_move = ai_move
-                        print(f"AI move made: {move_san}")
-                        if board.is_check():
-                            if CHECK_SOUND:
-                                CHECK_SOUND.play()
-                    else:
-                        print(f"Warning: AI failed to produce a move with board state: {board.fen()}")
-                    ai_thinking = False
-        
-        if board.is_game_over():
-            pygame.display.flip()
-            time.sleep(1)
-            
-            if board.is_checkmate():
-                winner = "White" if board.turn == chess.BLACK else "Black"
-                result_message = f"Checkmate! {winner} wins!"
-            elif board.is_stalemate():
-                result_message = "Stalemate! It's a draw!"
-            elif board.is_insufficient_material():
-                result_message = "Draw due to insufficient material!"
-            elif board.can_claim_draw():
-                result_message = "Draw (50-move rule or repetition)"
-            else:
-                result_message = "Game over!"
-            
-            print(f"Game over detected: {result_message}")
-            result = show_game_result(board, last_move, result_message, mode, difficulty, move_history, player_color, ai_color)
-            return result
+                ai_thinking = True
+                ai_start_due = False
+                ai_difficulty = current_difficulty
+                if ai_worker.is_pondering():
+                    print("Ponder hit" if ai_worker.ponder_hit(board) else "Ponder miss")
+                pygame.time.set_timer(AI_START_EVENT, AI_MOVE_DELAY_MS, loops=1)
+                print(f"AI thinking started for {current_difficulty} at turn {board.turn}")
         
-        pygame.display.flip()
-        clock.tick(60)
+        position = position.update(board)
+        if position.is_game_over:
+            # hiện nước cuối một lúc rồi mới chuyển sang màn hình kết quả
+            if not game_over_pending:
+                game_over_pending = True
+                selected_square = None
+                ai_worker.cancel()
+                move_log.view(None)
+                renderer.draw(board, position, None, last_move, move_log)
+                pygame.time.set_timer(GAME_OVER_EVENT, GAME_OVER_DELAY_MS, loops=1)
+            elif game_over_due:
+                result_message = position.result_message()
+                print(f"Game over detected: {result_message}")
+                ai_worker.shutdown()
+                result = show_game_result(board, last_move, result_message, mode, difficulty, move_log, player_color, ai_color)
+                return result
     
+    stop_game_timers()
+    ai_worker.shutdown()
     return "quit"
 
 # Main function
 def main():
+    if LOG_SEARCH_STATS:
+        import logging
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    if TT_FILE:
+        try:
+            use_persistent_table(TT_FILE)
+        except OSError as e:
+            print(f"Error opening transposition table file {TT_FILE}: {str(e)}")
+    init_display()
     load_images()
     action = None
     
@@ -0,0 +1,246 @@
+import sys
+import threading
+import time
+import chess
+import chess_engine
+
+# UCI front-end for the built-in engine: python uci.py
+# Supports uci, isready, ucinewgame, setoption, position, go, stop, quit and a bench command.
+
+ENGINE_NAME = "Chess Game AI"
+ENGINE_AUTHOR = "txphu2302"
+
+# Fixed positions searched by "bench": the node total is the engine's speed/behaviour signature
+BENCH_POSITIONS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4",
+    "r2q1rk1/ppp2ppp/2np1n2/2b1p1B1/2B1P1b1/2NP1N2/PPP2PPP/R2Q1RK1 w - - 0 8",
+    "r1bq1rk1/pp3ppp/2n1pn2/3p4/1bPP4/2NBPN2/PP3PPP/R2QK2R b KQ - 0 8",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/5pk1/6p1/8/3R4/6P1/5PK1/3r4 w - - 0 40",
+    "8/8/4k3/3p4/3P4/4K3/8/8 w - - 0 1",
+]
+BENCH_DEPTH = 4
+
+# Default search depth when "go" sets no depth limit
+MAX_SEARCH_DEPTH = 64
+
+def send(line):
+    print(line, flush=True)
+
+# UCI score of a White-relative engine score, from the side to move's point of view. Mate
+# scores are MATE_SCORE minus the plies to mate.
+def uci_score(score, turn):
+    if turn == chess.BLACK:
+        score = -score
+    if abs(score) >= chess_engine.MATE_THRESHOLD:
+        moves_to_mate = (int(chess_engine.MATE_SCORE - abs(score)) + 1) // 2
+        return f"mate {moves_to_mate if score > 0 else -moves_to_mate}"
+    return f"cp {int(round(score))}"
+
+def info_line(info, turn):
+    elapsed = max(info["time"], 1e-6)
+    pv = " ".join(move.uci() for move in info["pv"])
+    return (f"info depth {info['depth']} score {uci_score(info['score'], turn)} "
+            f"nodes {info['nodes']} nps {int(info['nodes'] / elapsed)} time {int(elapsed * 1000)} pv {pv}")
+
+# Time to spend on one move given the "go" clock parameters, or None for no limit
+def time_budget(board, params):
+    if "movetime" in params:
+        return params["movetime"] / 1000
+    remaining = params.get("wtime" if board.turn == chess.WHITE else "btime")
+    if remaining is None:
+        return None
+    increment = params.get("winc" if board.turn == chess.WHITE else "binc", 0)
+    moves_to_go = max(1, params.get("movestogo", 30))
+    budget = remaining / moves_to_go + increment * 0.8
+    return max(0.01, min(budget, remaining * 0.5) / 1000)
+
+def parse_position(tokens):
+    if tokens[0] == "startpos":
+        board = chess.Board()
+        tokens = tokens[1:]
+    elif tokens[0] == "fen":
+        fen_end = tokens.index("moves") if "moves" in tokens else len(tokens)
+        board = chess.Board(" ".join(tokens[1:fen_end]))
+        tokens = tokens[fen_end:]
+    else:
+        raise ValueError(f"unknown position type: {tokens[0]}")
+    if tokens and tokens[0] == "moves":
+        for uci in tokens[1:]:
+            board.push_uci(uci)
+    return board
+
+def parse_go(tokens):
+    params = {}
+    integer_params = ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes")
+    i = 0
+    while i < len(tokens):
+        if tokens[i] in integer_params and i + 1 < len(tokens):
+            params[tokens[i]] = int(tokens[i + 1])
+            i += 2
+        else:
+            if tokens[i] == "infinite":
+                params["infinite"] = True
+            i += 1
+    return params
+
+# Search every bench position to a fixed depth from an empty table; prints nodes and nps
+def bench(depth=BENCH_DEPTH, difficulty="hard"):
+    total_nodes = 0
+    start = time.perf_counter()
+    for fen in BENCH_POSITIONS:
+        chess_engine.transposition_table.clear()
+        board = chess.Board(fen)
+        context = chess_engine.SearchContext()
+        move = chess_engine.make_ai_move(board, difficulty, context, time_limit=0, max_depth=depth, workers=1,
+                                         use_book=False, use_tablebase=False)
+        total_nodes += context.nodes
+        send(f"info string {fen} bestmove {move.uci() if move else '(none)'} nodes {context.nodes}")
+    elapsed = time.perf_counter() - start
+    send("===========================")
+    send(f"Total time (ms) : {int(elapsed * 1000)}")
+    send(f"Nodes searched  : {total_nodes}")
+    send(f"Nodes/second    : {int(total_nodes / max(elapsed, 1e-6))}")
+    return total_nodes
+
+class UCIEngine:
+    def __init__(self):
+        self.board = chess.Board()
+        self.difficulty = "hard"
+        self.workers = 1
+        self.use_book = True
+        self.context = None
+        self.thread = None
+        # Set when the search thread may send its bestmove
+        self.release = None
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # A stop can arrive before the search thread has started its clock, so keep finishing until it returns
+    def stop(self):
+        while self.thread is not None and self.thread.is_alive():
+            self.release.set()
+            self.context.finish()
+            self.thread.join(0.05)
+        self.wait()
+
+    # tokens are the arguments of the go command
+    def go(self, tokens):
+        self.stop()
+        board = self.board.copy()
+        context = chess_engine.SearchContext()
+        context.on_iteration = lambda info: send(info_line(info, board.turn))
+        self.context = context
+
+        try:
+            params = parse_go(tokens)
+            time_limit = None if params.get("infinite") else time_budget(board, params)
+            max_depth = params.get("depth", MAX_SEARCH_DEPTH)
+        except Exception as e:
+            # The GUI waits for a bestmove after every go, so answer even if the search cannot start
+            send(f"info string error: {str(e)}")
+            fallback = next(iter(board.legal_moves), None)
+            send(f"bestmove {fallback.uci() if fallback else '0000'}")
+            return
+
+        # With go infinite the bestmove is held back until "stop", even if the search ends first
+        # (at MAX_SEARCH_DEPTH or on finding a mate)
+        release = threading.Event()
+        if not params.get("infinite"):
+            release.set()
+        self.release = release
+
+        def search():
+            move = chess_engine.make_ai_move(board, self.difficulty, context, time_limit=time_limit or 0,
+                                             node_limit=params.get("nodes"), max_depth=max_depth,
+                                             workers=self.workers, use_book=self.use_book)
+            release.wait()
+            send(f"bestmove {move.uci() if move else '0000'}")
+
+        self.thread = threading.Thread(target=search, daemon=True)
+        self.thread.start()
+
+    def set_option(self, tokens):
+        if "name" not in tokens or "value" not in tokens:
+            return
+        name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")]).lower()
+        value = " ".join(tokens[tokens.index("value") + 1:])
+        if name == "difficulty" and value in chess_engine.DIFFICULTY_SETTINGS:
+            self.difficulty = value
+        elif name == "threads":
+            self.workers = max(1, int(value))
+        elif name == "ownbook":
+            self.use_book = value.lower() == "true"
+        elif name == "bookfile":
+            chess_engine.OPENING_BOOK_PATH = value
+        elif name == "syzygypath":
+            chess_engine.SYZYGY_PATH = value
+        elif name == "hashfile" and value:
+            chess_engine.use_persistent_table(value)
+
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == "uci":
+            send(f"id name {ENGINE_NAME}")
+            send(f"id author {ENGINE_AUTHOR}")
+            send("option name Difficulty type combo default hard var medium var hard")
+            send("option name Threads type spin default 1 min 1 max 64")
+            send("option name OwnBook type check default true")
+            send(f"option name BookFile type string default {chess_engine.OPENING_BOOK_PATH}")
+            send(f"option name SyzygyPath type string default {chess_engine.SYZYGY_PATH}")
+            send("option name HashFile type string default <empty>")
+            send("uciok")
+        elif command == "isready":
+            send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            # A persistent table is kept: reusing it across games is its purpose
+            if not isinstance(chess_engine.transposition_table, chess_engine.PersistentTranspositionTable):
+                chess_engine.transposition_table.clear()
+            self.board = chess.Board()
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.stop()
+            self.board = parse_position(args)
+        elif command == "go":
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "bench":
+            self.stop()
+            bench(int(args[0]) if args else BENCH_DEPTH, self.difficulty)
+        elif command == "quit":
+            self.stop()
+            return False
+        else:
+            send(f"info string unknown command: {line.strip()}")
+        return True
+
+def main():
+    engine = UCIEngine()
+    if len(sys.argv) > 1:
+        # Run the command line as a single command, e.g. python uci.py bench 4
+        engine.handle(" ".join(sys.argv[1:]))
+        engine.wait()
+        return
+
+    for line in sys.stdin:
+        try:
+            if not engine.handle(line):
+                break
+        except Exception as e:
+            send(f"info string error: {str(e)}")
+    engine.stop()
+
+if __name__ == "__main__":
+    main()